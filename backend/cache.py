@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from flask import Response, make_response, request
+
+from backend.config import RESPONSE_CACHE
+from backend.database import data_version
+
+class ResponseCache:
+    """
+    进程内的接口响应缓存，按 (路由, 参数) 保存响应内容
+
+    条目超过 max_entries 时淘汰最久未使用的，超过 ttl 秒后过期；
+    每次查找前检查数据库的 data_version，抓取程序写入新数据后所有条目一起失效
+    """
+
+    def __init__(self, max_entries: int, ttl: float, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self.entries = OrderedDict()
+        self.version = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: tuple) -> Tuple[Optional[tuple], tuple]:
+        """
+        查找未过期的条目，数据库已变化时先清空缓存
+
+        Returns:
+            (条目，找不到时为None, 查找时的数据版本)，保存查询结果时把该版本传给 set
+        """
+        version = data_version()
+        now = time.monotonic()
+        with self.lock:
+            if version != self.version:
+                if self.entries:
+                    self.invalidations += 1
+                self.entries.clear()
+                self.version = version
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None, version
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], version
+
+    def set(self, key: tuple, value: tuple, version: tuple) -> None:
+        """保存条目；查询期间数据库已经变化（version 与当前版本不同）时不保存"""
+        with self.lock:
+            if version != self.version:
+                return
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+    def cached(self, params: Optional[Dict[str, Callable[[Optional[str]], Any]]] = None) -> Callable:
+        """
+        缓存路由的成功响应（状态码200）的装饰器，响应头 X-Cache 标明是否命中
+
+        Args:
+            params: 影响响应的参数及其解析函数（与路由使用同一个函数，参数不存在时传入None），
+                缓存键只包含解析后的这些参数，其他参数（如 _=时间戳）不会产生新的条目
+        """
+        params = params or {}
+
+        def decorator(func: Callable) -> Callable:
+            @wraps(func)
+            def wrapper(*args, **kwargs) -> Any:
+                if not self.enabled:
+                    return func(*args, **kwargs)
+
+                try:
+                    values = tuple((name, parse(request.args.get(name))) for name, parse in sorted(params.items()))
+                    key = (request.endpoint, tuple(sorted(kwargs.items())), values)
+                    cached, version = self.get(key)
+                    bypass = False
+                except (ValueError, TypeError, sqlite3.Error):
+                    bypass = True
+
+                if bypass:
+                    # 参数无效（由路由返回400）或数据库不可用（由路由自己处理）时不使用缓存
+                    response = make_response(func(*args, **kwargs))
+                    response.headers['X-Cache'] = 'BYPASS'
+                    return response
+
+                if cached is not None:
+                    body, status, mimetype = cached
+                    response = Response(body, status=status, mimetype=mimetype)
+                    response.headers['X-Cache'] = 'HIT'
+                    return response
+
+                response = make_response(func(*args, **kwargs))
+                if response.status_code == 200 and not response.direct_passthrough:
+                    self.set(key, (response.get_data(), response.status_code, response.mimetype), version)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
+
+response_cache = ResponseCache(RESPONSE_CACHE['max_entries'], RESPONSE_CACHE['ttl'], RESPONSE_CACHE['enabled'])
@@ -10,8 +10,21 @@ ROOT_DIR = Path(__file__).parent.parent.absolute()
 # 数据库配置
 DATABASE = {
     'path': os.getenv('DB_PATH', os.path.join(ROOT_DIR, 'data', 'games.db')),
+    # 连接参数：每个连接创建时设置一次
+    'mmap_size': int(os.getenv('DB_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size_kb': int(os.getenv('DB_CACHE_SIZE_KB', 64 * 1024)),
+    'busy_timeout_ms': int(os.getenv('DB_BUSY_TIMEOUT_MS', 5000)),
+    'cached_statements': int(os.getenv('DB_CACHED_STATEMENTS', 256)),
 }
 
+# 索引数据库（变更事件、URL生命周期）
+INDEX_DB = {
+    'path': os.getenv('INDEX_DB', os.path.join(ROOT_DIR, 'data', 'index.db')),
+}
+
+# 变更日志目录
+CHANGE_LOG_PATH = os.getenv('CHANGE_LOG_PATH', os.path.join(ROOT_DIR, 'data', 'change_log'))
+
 # API 配置
 API_CONFIG = {
     'host': os.getenv('API_HOST', '0.0.0.0'),
@@ -20,6 +33,13 @@ API_CONFIG = {
     'prefix': '/api',
 }
 
+# 响应缓存：数据库内容变化（PRAGMA data_version）时整体失效
+RESPONSE_CACHE = {
+    'enabled': os.getenv('RESPONSE_CACHE_ENABLED', 'True').lower() in ('true', '1', 't'),
+    'max_entries': int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 1024)),
+    'ttl': float(os.getenv('RESPONSE_CACHE_TTL', 300)),
+}
+
 # 分页配置
 PAGINATION = {
     'default_limit': int(os.getenv('DEFAULT_LIMIT', 100)),
@@ -1,32 +1,121 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import atexit
+import os
 import sqlite3
+import threading
+import weakref
 from contextlib import contextmanager
 from typing import Dict, List, Any, Generator, Optional
 
 from backend.config import DATABASE
 
-def dict_factory(cursor, row):
-    """将 SQLite 查询结果转换为字典格式"""
-    return {col[0]: row[idx] for idx, col in enumerate(cursor.description)}
+def fetch_dicts(cursor: sqlite3.Cursor, rows: List[tuple]) -> List[Dict[str, Any]]:
+    """把查询结果转换为字典列表，列名只取一次"""
+    if cursor.description is None:
+        return []
+    names = [col[0] for col in cursor.description]
+    return [dict(zip(names, row)) for row in rows]
+
+# 连接池：每个线程一个只读连接和一个读写连接，创建时设置一次参数后一直复用；
+# 连接按进程区分，gunicorn fork 出的 worker 不会使用父进程的连接
+class _PooledConnection(sqlite3.Connection):
+    """可以被弱引用的连接，线程结束后连接随线程数据一起释放"""
+
+_local = threading.local()
+_connections = weakref.WeakSet()
+_connections_lock = threading.Lock()
+_generation = 0
+
+def _connect(readonly: bool) -> sqlite3.Connection:
+    # 连接只在创建它的线程中使用，关闭时可能在其他线程（atexit）
+    conn = sqlite3.connect(DATABASE['path'], factory=_PooledConnection, check_same_thread=False,
+                           cached_statements=DATABASE['cached_statements'])
+    conn.execute(f"PRAGMA busy_timeout = {DATABASE['busy_timeout_ms']}")
+    conn.execute(f"PRAGMA mmap_size = {DATABASE['mmap_size']}")
+    conn.execute(f"PRAGMA cache_size = -{DATABASE['cache_size_kb']}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    if readonly:
+        # WAL 由抓取程序开启并持久保存在数据库文件中，只读连接不修改日志模式
+        conn.execute("PRAGMA query_only = ON")
+    else:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+    with _connections_lock:
+        _connections.add(conn)
+    return conn
+
+def _pooled_connection(readonly: bool) -> sqlite3.Connection:
+    key = (os.getpid(), _generation)
+    if getattr(_local, 'key', None) != key:
+        _local.key, _local.pool = key, {}
+    conn = _local.pool.get(readonly)
+    if conn is None:
+        conn = _local.pool[readonly] = _connect(readonly)
+    return conn
 
 @contextmanager
-def get_db_connection() -> Generator[sqlite3.Connection, None, None]:
-    """获取数据库连接，使用上下文管理器自动关闭连接"""
-    conn = sqlite3.connect(DATABASE['path'])
-    conn.row_factory = dict_factory
+def get_db_connection(readonly: bool = True) -> Generator[sqlite3.Connection, None, None]:
+    """获取当前线程复用的数据库连接，退出时回滚未提交的事务，连接不关闭"""
+    conn = _pooled_connection(readonly)
     try:
         yield conn
     finally:
-        conn.close()
+        if conn.in_transaction:
+            conn.rollback()
+
+def close_all() -> None:
+    """关闭当前进程创建的所有连接（进程退出或 gunicorn worker 退出时调用），之后的查询会重新建立连接"""
+    global _generation
+    with _connections_lock:
+        connections = list(_connections)
+        _connections.clear()
+        _generation += 1
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+atexit.register(close_all)
+
+# 检查数据版本专用的连接，只执行 PRAGMA data_version，由所有线程共用
+_version_lock = threading.Lock()
+_version_conn = None
+_version_key = None
+
+def data_version() -> tuple:
+    """
+    数据库内容的版本标识：专用连接上的 PRAGMA data_version，抓取程序或API的写连接提交修改后就会变化；
+    连接重建（进程 fork、close_all）后标识也会变化
+    """
+    global _version_conn, _version_key
+    key = (os.getpid(), _generation)
+    with _version_lock:
+        if _version_key != key:
+            _version_conn, _version_key = _connect(True), key
+        return key + (_version_conn.execute("PRAGMA data_version").fetchone()[0],)
+
+# 已确认的数据库结构版本，迁移只会升级版本，达到需要的版本后不再查询
+_schema_version = 0
+
+def schema_version(required: int) -> int:
+    """
+    数据库结构版本（PRAGMA user_version，由抓取程序迁移），已知版本低于 required 时重新查询
+    """
+    global _schema_version
+    if _schema_version < required:
+        with get_db_connection() as conn:
+            _schema_version = conn.execute("PRAGMA user_version").fetchone()[0]
+    return _schema_version
 
 def execute_query(query: str, params: tuple = ()) -> List[Dict[str, Any]]:
     """执行数据库查询并返回结果"""
     with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(query, params)
-        return cursor.fetchall()
+        return fetch_dicts(cursor, cursor.fetchall())
 
 def execute_query_one(query: str, params: tuple = ()) -> Optional[Dict[str, Any]]:
     """执行数据库查询并返回单个结果"""
@@ -34,11 +123,21 @@ def execute_query_one(query: str, params: tuple = ()) -> Optional[Dict[str, Any]
         cursor = conn.cursor()
         cursor.execute(query, params)
         result = cursor.fetchone()
-        return result if result else None
+        return fetch_dicts(cursor, [result])[0] if result else None
+
+def execute_queries(queries: List[tuple]) -> List[List[Dict[str, Any]]]:
+    """在同一个连接中依次执行多个查询，每个元组包含(query, params)，返回每个查询的结果"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        results = []
+        for query, params in queries:
+            cursor.execute(query, params)
+            results.append(fetch_dicts(cursor, cursor.fetchall()))
+        return results
 
 def execute_insert(query: str, params: tuple = ()) -> int:
     """执行插入操作并返回最后插入的ID"""
-    with get_db_connection() as conn:
+    with get_db_connection(readonly=False) as conn:
         cursor = conn.cursor()
         cursor.execute(query, params)
         conn.commit()
@@ -46,7 +145,7 @@ def execute_insert(query: str, params: tuple = ()) -> int:
 
 def execute_update(query: str, params: tuple = ()) -> int:
     """执行更新操作并返回影响的行数"""
-    with get_db_connection() as conn:
+    with get_db_connection(readonly=False) as conn:
         cursor = conn.cursor()
         cursor.execute(query, params)
         conn.commit()
@@ -54,7 +153,7 @@ def execute_update(query: str, params: tuple = ()) -> int:
 
 def execute_transaction(queries: List[tuple]) -> bool:
     """执行事务，每个元组包含(query, params)"""
-    with get_db_connection() as conn:
+    with get_db_connection(readonly=False) as conn:
         try:
             conn.execute("BEGIN TRANSACTION")
             for query, params in queries:
@@ -64,4 +163,4 @@ def execute_transaction(queries: List[tuple]) -> bool:
         except Exception as e:
             conn.rollback()
             print(f"事务执行失败: {str(e)}")
-            return False 
\ No newline at end of file
+            return False
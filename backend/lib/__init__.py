@@ -0,0 +1,9 @@
+from .data import load_config
+from .httpclient import HttpClient, ValidatorCache
+from .initial_state import extract_initial_state, extract_initial_state_soup
+from .metrics import Metrics
+from .migrations import get_version, migrate
+from .ratelimit import HostRateLimiter, TokenBucket
+from .sitemap import find_latest_sitemap, get_game_urls
+
+SITEMAP_PATH = load_config().get('sitemap_path', 'data/sitemaps')
@@ -0,0 +1,204 @@
+import bisect
+import json
+import os
+import threading
+from datetime import datetime
+
+# 快照文件格式：
+#   {site}_{date}_{time}.xml / .xml.gz   原始sitemap（旧格式，作为完整快照读取）
+#   {site}_{date}_{time}.full.gz         完整快照：排序后的URL列表，每行一个
+#   {site}_{date}_{time}.delta.gz        增量快照：相对上一个快照的变化，每行 "+URL" 或 "-URL"
+RAW_SUFFIXES = ('.xml', '.xml.gz')
+FULL_SUFFIX = '.full.gz'
+DELTA_SUFFIX = '.delta.gz'
+SNAPSHOT_SUFFIXES = RAW_SUFFIXES + (FULL_SUFFIX, DELTA_SUFFIX)
+
+STAMP_FORMAT = "%Y%m%d_%H%M%S"
+
+def parse_snapshot_name(filename):
+    """
+    解析快照文件名
+
+    Returns:
+        (站点, 时间戳字符串 YYYYMMDD_HHMMSS, 后缀)，不是快照文件时返回None
+    """
+    name, _, suffix = filename.partition('.')
+    suffix = f".{suffix}"
+    parts = name.rsplit('_', 2)
+    if suffix not in SNAPSHOT_SUFFIXES or len(parts) != 3:
+        return None
+    return parts[0], f"{parts[1]}_{parts[2]}", suffix
+
+def catalog_path(sitemap_path):
+    """
+    目录清单保存在快照目录旁边（data/sitemaps -> data/sitemaps.catalog.json），
+    写清单不会改变快照目录本身的修改时间
+    """
+    return f"{os.path.normpath(sitemap_path)}.catalog.json"
+
+class SnapshotCatalog:
+    """
+    快照目录清单：按站点保存按时间排序的快照文件名，
+    latest / previous / at 查询都是二分查找，不再扫描目录
+
+    清单中记录了快照目录的修改时间，目录被外部修改（git checkout、手动删除等）时自动重建
+    """
+
+    def __init__(self, sitemap_path):
+        self.sitemap_path = sitemap_path
+        self.path = catalog_path(sitemap_path)
+        self._lock = threading.RLock()
+        self._stamps = {}
+        self._files = {}
+        self._dir_mtime = None
+        self._load()
+
+    def _current_mtime(self):
+        return os.stat(self.sitemap_path).st_mtime_ns
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = None
+        if not data or data.get('dir_mtime') != self._current_mtime():
+            self.rebuild()
+            return
+        self._dir_mtime = data['dir_mtime']
+        for site, files in data['sites'].items():
+            self._files[site] = list(files)
+            self._stamps[site] = [parse_snapshot_name(f)[1] for f in files]
+
+    def _refresh(self):
+        if self._dir_mtime != self._current_mtime():
+            self.rebuild()
+
+    def rebuild(self):
+        """
+        扫描快照目录重建清单
+        """
+        with self._lock:
+            entries = {}
+            for filename in os.listdir(self.sitemap_path):
+                parsed = parse_snapshot_name(filename)
+                if parsed:
+                    entries.setdefault(parsed[0], []).append((parsed[1], filename))
+            self._stamps, self._files = {}, {}
+            for site, items in entries.items():
+                items.sort()
+                self._stamps[site] = [stamp for stamp, _ in items]
+                self._files[site] = [filename for _, filename in items]
+            self.save()
+
+    def save(self):
+        with self._lock:
+            self._dir_mtime = self._current_mtime()
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'dir_mtime': self._dir_mtime, 'sites': self._files}, f, ensure_ascii=False, indent=1)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                # 目录只读时只保留内存中的清单
+                print(f"保存快照清单失败: {e}")
+
+    def add(self, filename):
+        """
+        登记一个新写入的快照文件
+
+        调用方写入文件时目录的修改时间已经变化，这里不再与之比较（否则每次都会重建），
+        应用这次已知的变更后以当前修改时间保存
+        """
+        parsed = parse_snapshot_name(filename)
+        if parsed is None:
+            raise ValueError(f"不是快照文件: {filename}")
+        site, stamp, _ = parsed
+        with self._lock:
+            stamps = self._stamps.setdefault(site, [])
+            files = self._files.setdefault(site, [])
+            if filename not in files:
+                index = bisect.bisect_right(stamps, stamp)
+                stamps.insert(index, stamp)
+                files.insert(index, filename)
+            self.save()
+
+    def remove(self, filename):
+        """
+        移除一个已删除的快照文件（与 add 相同，不因调用方删除文件而重建）
+        """
+        parsed = parse_snapshot_name(filename)
+        if parsed is None:
+            return
+        site, stamp, _ = parsed
+        with self._lock:
+            stamps, files = self._stamps.get(site, []), self._files.get(site, [])
+            index = bisect.bisect_left(stamps, stamp)
+            while index < len(stamps) and stamps[index] == stamp:
+                if files[index] == filename:
+                    del stamps[index], files[index]
+                    break
+                index += 1
+            self.save()
+
+    def files(self, site):
+        """
+        站点的所有快照文件，按时间从旧到新排序
+        """
+        with self._lock:
+            self._refresh()
+            return list(self._files.get(site, []))
+
+    def at(self, site, when):
+        """
+        指定时间点（datetime 或 YYYYMMDD_HHMMSS 字符串）之前（含）最近的快照文件，没有时返回None
+        """
+        stamp = when if isinstance(when, str) else when.strftime(STAMP_FORMAT)
+        with self._lock:
+            self._refresh()
+            index = bisect.bisect_right(self._stamps.get(site, []), stamp)
+            return self._files[site][index - 1] if index else None
+
+    def latest(self, site):
+        """
+        站点最新的快照文件，没有时返回None
+        """
+        with self._lock:
+            self._refresh()
+            files = self._files.get(site)
+            return files[-1] if files else None
+
+    def previous(self, site, filename=None):
+        """
+        指定快照（默认最新快照）的上一个快照文件，没有时返回None
+        """
+        with self._lock:
+            self._refresh()
+            files = self._files.get(site, [])
+            if filename is None:
+                index = len(files) - 1
+            else:
+                stamps = self._stamps.get(site, [])
+                index = bisect.bisect_left(stamps, parse_snapshot_name(filename)[1])
+                while index < len(files) and files[index] != filename:
+                    index += 1
+                if index == len(files):
+                    return None
+            return files[index - 1] if index > 0 else None
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+def get_catalog(sitemap_path):
+    """
+    获取快照目录对应的清单，同一进程内共享
+    """
+    key = os.path.abspath(sitemap_path)
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = _catalogs[key] = SnapshotCatalog(sitemap_path)
+        return catalog
+
+def snapshot_time(filename):
+    return datetime.strptime(parse_snapshot_name(filename)[1], STAMP_FORMAT)
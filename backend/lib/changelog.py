@@ -0,0 +1,256 @@
+import bisect
+import json
+import os
+import threading
+import zlib
+
+# 变更日志 {site}.jsonl 旁边保存偏移索引 {site}.idx，每行对应日志中的一行：
+#   "{时间} {字节偏移}"
+# 时间取日志开头到该行为止出现过的最大时间（日志按时间追加时就是该行的时间），
+# 保证索引中的时间单调不减，可以二分查找第一条不早于指定时间的记录
+# 索引文件第一行 "#head {字节数} {crc32}" 记录日志开头部分的校验值，日志被改写（即使长度不变或变长）时重建索引
+INDEX_SUFFIX = '.idx'
+HEAD_BYTES = 4096
+
+_decoder = json.JSONDecoder()
+
+def changelog_file(changelog_path, site):
+    return os.path.join(changelog_path, f"{site}.jsonl")
+
+def index_file(path):
+    return f"{os.path.splitext(path)[0]}{INDEX_SUFFIX}"
+
+def decode_line(line):
+    """
+    解码日志中的一行，早期的日志中有缺少换行、多条记录写在同一行的情况
+
+    Returns:
+        记录列表
+    """
+    line = line.strip()
+    records, pos = [], 0
+    while pos < len(line):
+        record, pos = _decoder.raw_decode(line, pos)
+        records.append(record)
+        while pos < len(line) and line[pos].isspace():
+            pos += 1
+    return records
+
+class ChangelogIndex:
+    """
+    变更日志的偏移索引：keys 为单调不减的时间，offsets 为对应行的起始字节偏移，
+    end 为已建立索引的日志长度，head 为日志开头部分的 (字节数, crc32)；
+    generation 在每次重建索引时加一，依赖偏移的缓存据此判断是否需要重新计算
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.generation = 0
+        self._stat = None
+        self.reset()
+
+    def reset(self):
+        self.keys = []
+        self.offsets = []
+        self.end = 0
+        self.head = (0, 0)
+        self.generation += 1
+
+    def _read_head(self, size):
+        with open(self.path, 'rb') as f:
+            data = f.read(size)
+        return len(data), zlib.crc32(data)
+
+    def load(self):
+        """
+        读取索引文件，并通过最后一行的位置还原已建立索引的日志长度
+        """
+        self.reset()
+        try:
+            with open(index_file(self.path), 'r', encoding='utf-8') as f:
+                header = f.readline().split()
+                if len(header) != 3 or header[0] != '#head':
+                    # 旧格式的索引没有校验值，重建
+                    return self
+                head = (int(header[1]), int(header[2]))
+                for line in f:
+                    key, offset = line.split()
+                    self.keys.append(key)
+                    self.offsets.append(int(offset))
+            if self._read_head(head[0]) != head:
+                self.reset()
+                return self
+            self.head = head
+        except (OSError, ValueError):
+            self.reset()
+            return self
+        if self.offsets:
+            with open(self.path, 'rb') as f:
+                f.seek(self.offsets[-1])
+                last_line = f.readline()
+            # 最后一行不完整或内容对不上，说明日志被改写过，需要重建
+            if not last_line.endswith(b'\n') or not self._line_matches(last_line):
+                self.reset()
+                return self
+            self.end = self.offsets[-1] + len(last_line)
+        return self
+
+    def _line_matches(self, line):
+        try:
+            records = decode_line(line.decode('utf-8'))
+        except ValueError:
+            return False
+        return bool(records) and max(r['datetime'] for r in records) <= self.keys[-1]
+
+    def refresh(self):
+        """
+        日志在索引之后追加了内容时只为新增的行建立索引，日志被截断或开头部分被改写时重建
+
+        Returns:
+            是否更新了索引
+        """
+        stat = os.stat(self.path)
+        if (stat.st_size, stat.st_mtime_ns) == self._stat:
+            return False
+        self._stat = (stat.st_size, stat.st_mtime_ns)
+        size = stat.st_size
+        if size < self.end or (self.end and self._read_head(self.head[0]) != self.head):
+            self.reset()
+        if size == self.end:
+            return False
+
+        with open(self.path, 'rb') as f:
+            f.seek(self.end)
+            offset = self.end
+            for line in f:
+                # 末尾还没有写完的行留到下次
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    records = decode_line(line.decode('utf-8'))
+                except ValueError:
+                    records = []
+                if records:
+                    key = max(r['datetime'] for r in records)
+                    if self.keys and self.keys[-1] > key:
+                        key = self.keys[-1]
+                    self.keys.append(key)
+                    self.offsets.append(offset)
+                offset += len(line)
+        self.end = offset
+        if self.head[0] < HEAD_BYTES:
+            self.head = self._read_head(min(HEAD_BYTES, self.end))
+        self.save()
+        return True
+
+    def save(self):
+        # 整体写入后替换，API的多个进程同时补充索引时结果也一致；
+        # 目录只读（如 Vercel 部署）时只保留内存中的索引
+        path = index_file(self.path)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(f"#head {self.head[0]} {self.head[1]}\n")
+                for key, offset in zip(self.keys, self.offsets):
+                    f.write(f"{key} {offset}\n")
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"保存变更日志索引失败，只使用内存中的索引: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def seek_offset(self, since):
+        """
+        第一条时间不早于 since 的记录所在行的偏移，没有时返回日志末尾
+        """
+        index = bisect.bisect_left(self.keys, since)
+        return self.offsets[index] if index < len(self.offsets) else self.end
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_index(path):
+    """
+    获取日志的偏移索引，同一进程内缓存，日志有新内容时自动补充
+    """
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = ChangelogIndex(path).load()
+        index.refresh()
+        return index
+
+def iter_records(path, since=None, start=0, end=None):
+    """
+    按文件顺序读取日志记录，只解码不早于 since 的部分
+
+    Args:
+        path: 日志文件路径
+        since: 开始时间 'YYYYMMDDTHHMMSS'，None表示全部
+        start: 从该字节偏移开始读取
+        end: 读到该字节偏移为止，None表示读到文件末尾
+
+    Yields:
+        (行偏移, 记录)
+    """
+    if not os.path.exists(path):
+        return
+    index = get_index(path)
+    offset = max(index.seek_offset(since), start) if since else start
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if end is not None and offset >= end:
+                break
+            try:
+                records = decode_line(line.decode('utf-8'))
+            except ValueError:
+                records = []
+            for record in records:
+                if since is None or record.get('datetime', '') >= since:
+                    yield offset, record
+            offset += len(line)
+
+def iter_records_reverse(path, before=None, since=None):
+    """
+    从日志末尾向前读取记录（日志按时间追加，即按时间倒序），通过偏移索引逐行定位
+
+    Args:
+        path: 日志文件路径
+        before: 从包含不晚于该时间 'YYYYMMDDTHHMMSS' 的记录的行开始，None表示从末尾开始
+        since: 读到早于该时间的记录为止，None表示读到开头
+
+    Yields:
+        (行偏移, 行内序号, 记录)
+    """
+    if not os.path.exists(path):
+        return
+    index = get_index(path)
+    keys, offsets = index.keys, index.offsets
+    position = len(offsets)
+    if before is not None:
+        # 同一行中有多条记录时，第一条时间晚于 before 的行中也可能有更早的记录，一并读取
+        position = min(bisect.bisect_right(keys, before) + 1, position)
+    with open(path, 'rb') as f:
+        for i in range(position - 1, -1, -1):
+            # 索引中的时间是到该行为止的最大时间，小于 since 时之前的行都不需要
+            if since is not None and keys[i] < since:
+                break
+            f.seek(offsets[i])
+            try:
+                records = decode_line(f.readline().decode('utf-8'))
+            except ValueError:
+                continue
+            for pos in range(len(records) - 1, -1, -1):
+                if since is None or records[pos].get('datetime', '') >= since:
+                    yield offsets[i], pos, records[pos]
+
+def append_record(path, record):
+    """
+    追加一条记录到日志，同时更新偏移索引
+    """
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
+    get_index(path)
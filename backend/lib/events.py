@@ -0,0 +1,138 @@
+import sqlite3
+
+from .changelog import iter_records
+from .lifetime import changelog_time, connect_index, format_time
+
+# 变更事件：把变更日志中的 added_urls / deleted_urls 拆成每个URL一行，和URL生命周期索引放在同一个数据库中
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS change_events (
+    site TEXT NOT NULL,
+    datetime TEXT NOT NULL,
+    url TEXT NOT NULL,
+    action TEXT NOT NULL CHECK (action IN ('added', 'deleted')),
+    PRIMARY KEY (site, datetime, url, action)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_change_events_datetime ON change_events (datetime);
+CREATE INDEX IF NOT EXISTS idx_change_events_url ON change_events (url, datetime);
+CREATE INDEX IF NOT EXISTS idx_change_events_site_url ON change_events (site, url, datetime);
+CREATE TABLE IF NOT EXISTS change_events_state (
+    site TEXT PRIMARY KEY,
+    last_applied TEXT NOT NULL
+);
+"""
+
+BACKFILL_BATCH_SIZE = 5000
+
+def connect_events(path):
+    """
+    打开索引数据库并确保变更事件表存在
+    """
+    conn = connect_index(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+def open_readonly(path):
+    """
+    以只读方式打开索引数据库，文件不存在时抛出 sqlite3.OperationalError
+    """
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def _event_rows(site, when, added_urls, deleted_urls):
+    when = format_time(when)
+    for url in added_urls:
+        yield site, when, url, 'added'
+    for url in deleted_urls:
+        yield site, when, url, 'deleted'
+
+def events_applied(conn, site):
+    """
+    站点最后一次导入变更事件表的变更时间，还没有导入过时返回None
+    """
+    row = conn.execute("SELECT last_applied FROM change_events_state WHERE site = ?", (site,)).fetchone()
+    return row[0] if row else None
+
+def backfill_events(conn, site, changelog_path, since=None, batch_size=BACKFILL_BATCH_SIZE):
+    """
+    把站点的变更日志批量导入变更事件表，已存在的事件会被忽略；
+    和导入位置 change_events_state 在同一个事务中提交
+
+    Args:
+        conn: 索引数据库连接
+        site: 站点名称
+        changelog_path: 站点的变更日志文件
+        since: 只导入不早于该时间（'YYYY-MM-DD HH:MM:SS'）的记录，None表示全部
+        batch_size: 每次 executemany 写入的行数
+
+    Returns:
+        新写入的行数
+    """
+    inserted, batch, last = 0, [], since
+    with conn:
+        for _, record in iter_records(changelog_path, changelog_time(since)):
+            if not record.get('datetime'):
+                continue
+            when = format_time(record['datetime'])
+            last = max(last or when, when)
+            batch.extend(_event_rows(site, record['datetime'], record.get('added_urls', []),
+                                     record.get('deleted_urls', [])))
+            if len(batch) >= batch_size:
+                inserted += conn.executemany("INSERT OR IGNORE INTO change_events VALUES (?, ?, ?, ?)", batch).rowcount
+                batch = []
+        if batch:
+            inserted += conn.executemany("INSERT OR IGNORE INTO change_events VALUES (?, ?, ?, ?)", batch).rowcount
+        if last is not None:
+            conn.execute("""
+                INSERT INTO change_events_state (site, last_applied) VALUES (?, ?)
+                ON CONFLICT(site) DO UPDATE SET last_applied = excluded.last_applied
+            """, (site, last))
+    return inserted
+
+def sync_events(conn, site, changelog_path):
+    """
+    从上次导入的位置继续导入变更日志（之前写入失败的变更会在这里补上）
+
+    Returns:
+        新写入的行数
+    """
+    return backfill_events(conn, site, changelog_path, since=events_applied(conn, site))
+
+def _prefix_upper_bound(prefix):
+    # 前缀查询转换为范围查询 url >= prefix AND url < upper，可以使用索引
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+def query_events(conn, sites=None, start=None, end=None, url_prefix=None, limit=100, offset=0):
+    """
+    按站点、时间范围和URL前缀查询变更事件，按时间倒序
+
+    Args:
+        conn: 索引数据库连接
+        sites: 站点名称列表，None表示所有站点
+        start: 开始时间（含），'YYYY-MM-DD HH:MM:SS'
+        end: 结束时间（不含），'YYYY-MM-DD HH:MM:SS'
+        url_prefix: URL前缀
+
+    Returns:
+        [(site, datetime, url, action), ...]
+    """
+    conditions, params = [], []
+    if sites is not None:
+        conditions.append(f"site IN ({','.join('?' * len(sites))})")
+        params.extend(sites)
+    if start is not None:
+        conditions.append("datetime >= ?")
+        params.append(start)
+    if end is not None:
+        conditions.append("datetime < ?")
+        params.append(end)
+    if url_prefix:
+        conditions.append("url >= ? AND url < ?")
+        params.extend([url_prefix, _prefix_upper_bound(url_prefix)])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return conn.execute(f"""
+        SELECT site, datetime, url, action FROM change_events
+        {where}
+        ORDER BY datetime DESC, site, action, url
+        LIMIT ? OFFSET ?
+    """, params + [limit, offset]).fetchall()
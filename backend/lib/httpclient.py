@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 上没有 fcntl，只保证单个进程内的写入安全
+    fcntl = None
+
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    ACCEPT_ENCODING = 'gzip, deflate'
+
+
+class ValidatorCache:
+    """
+    保存每个URL上次响应的 ETag / Last-Modified，用于条件请求
+
+    多个抓取进程共用同一个文件：保存时加文件锁，重新读取文件并只覆盖本进程修改过的URL，
+    不会丢失其他进程保存的内容
+
+    Args:
+        path: JSON文件路径，为None时只保存在内存中
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        # 自上次保存以来本进程修改过的URL，值为None表示删除
+        self._changes = {}
+        self._data = self._load() if path else {}
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"加载HTTP缓存失败: {e}")
+            return {}
+
+    def get(self, url):
+        with self._lock:
+            return self._data.get(url)
+
+    def set(self, url, etag=None, last_modified=None):
+        entry = {}
+        if etag:
+            entry['etag'] = etag
+        if last_modified:
+            entry['last_modified'] = last_modified
+        with self._lock:
+            if entry:
+                if self._data.get(url) != entry:
+                    self._data[url] = self._changes[url] = entry
+            elif self._data.pop(url, None) is not None:
+                self._changes[url] = None
+
+    def save(self):
+        """
+        将本进程的修改合并写回文件（先写本进程的临时文件再替换，避免写到一半被读取）
+        """
+        if not self.path:
+            return
+        with self._lock:
+            if not self._changes:
+                return
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(f"{self.path}.lock", 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                data = self._load()
+                for url, entry in self._changes.items():
+                    if entry is None:
+                        data.pop(url, None)
+                    else:
+                        data[url] = entry
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, sort_keys=True, indent=0)
+                os.replace(tmp_path, self.path)
+            self._data = data
+            self._changes = {}
+
+
+class HttpClient:
+    """
+    共享连接池的HTTP客户端：保持长连接、协商压缩，并支持 ETag / If-Modified-Since 条件请求
+
+    Args:
+        pool_size: 每个域名保留的最大连接数，应不小于并发请求数
+        validators: ValidatorCache 实例，为None时不发送条件请求
+        timeout: 默认请求超时（秒）
+    """
+
+    def __init__(self, pool_size=10, validators=None, timeout=30):
+        self.validators = validators
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Accept-Encoding': ACCEPT_ENCODING})
+
+    def get(self, url, conditional=True, **kwargs):
+        """
+        发送GET请求
+
+        Args:
+            url: 请求地址
+            conditional: 是否携带上次响应的校验信息
+            
+        Returns:
+            Response对象；服务器返回304（内容未变化）时返回None
+            响应的校验信息不会自动保存，调用方处理（保存）成功后调用 remember，
+            避免处理失败的内容之后一直得到304而被跳过
+        """
+        headers = dict(kwargs.pop('headers', None) or {})
+        cached = self.validators.get(url) if self.validators and conditional else None
+        if cached:
+            if 'etag' in cached:
+                headers['If-None-Match'] = cached['etag']
+            if 'last_modified' in cached:
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        kwargs.setdefault('timeout', self.timeout)
+        res = self.session.get(url, headers=headers, **kwargs)
+        if res.status_code == 304:
+            return None
+        res.raise_for_status()
+        return res
+
+    def remember(self, url, res):
+        """
+        保存响应的 ETag / Last-Modified，下次请求该URL时作为条件请求发送
+        """
+        if self.validators is not None and res is not None:
+            self.validators.set(url, res.headers.get('ETag'), res.headers.get('Last-Modified'))
+
+    def close(self):
+        if self.validators is not None:
+            self.validators.save()
+        self.session.close()
@@ -0,0 +1,71 @@
+import json
+import re
+
+from bs4 import BeautifulSoup
+
+MARKER = b'window.INITIAL_STATE'
+SCRIPT_END = b'</script>'
+WHITESPACE = b' \t\r\n'
+
+_decoder = json.JSONDecoder()
+
+
+def extract_initial_state(content):
+    """
+    直接在页面字节中定位 window.INITIAL_STATE = {...} 赋值，只把这一段交给JSON解析器，
+    不构建HTML树
+
+    Args:
+        content: 页面内容（bytes）
+        
+    Returns:
+        解析后的INITIAL_STATE字典，未找到或解析失败时返回None
+    """
+    start = content.find(MARKER)
+    while start >= 0:
+        i = start + len(MARKER)
+        while i < len(content) and content[i] in WHITESPACE:
+            i += 1
+        if content[i:i + 1] == b'=':
+            i += 1
+            while i < len(content) and content[i] in WHITESPACE:
+                i += 1
+            if content[i:i + 1] == b'{':
+                end = content.find(SCRIPT_END, i)
+                span = content[i:end] if end >= 0 else content[i:]
+                try:
+                    state, _ = _decoder.raw_decode(span.decode('utf-8'))
+                    return state
+                except ValueError:
+                    return None
+        # 只是引用而不是赋值，继续查找下一处
+        start = content.find(MARKER, i)
+    return None
+
+
+def extract_initial_state_soup(html):
+    """
+    使用BeautifulSoup逐个检查script标签提取INITIAL_STATE，作为快速提取失败时的兜底
+
+    Args:
+        html: 页面内容（str）
+        
+    Returns:
+        解析后的INITIAL_STATE字典，未找到或解析失败时返回None
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    for script in soup.find_all('script'):
+        script_content = script.string
+        if not script_content or 'window.INITIAL_STATE' not in script_content:
+            continue
+
+        # 使用正则表达式提取window.INITIAL_STATE = {...} 之间的JSON内容
+        matches = re.search(r'window\.INITIAL_STATE\s*=\s*(\{[\s\S]*)', script_content)
+        if matches is None:
+            continue
+        try:
+            state, _ = _decoder.raw_decode(matches.group(1))
+            return state
+        except ValueError as e:
+            print(f"提取INITIAL_STATE时出错: {e}")
+    return None
@@ -0,0 +1,223 @@
+import os
+import sqlite3
+from datetime import datetime
+
+from .catalog import snapshot_time
+
+# URL生命周期索引：记录每个站点出现过的每个URL的在线区间 [start, end)，end 为空表示目前仍在线
+# 时间统一保存为 'YYYY-MM-DD HH:MM:SS'，可以直接排序和使用 julianday 计算
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+CHANGELOG_TIME_FORMAT = "%Y%m%dT%H%M%S"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS url_presence (
+    site TEXT NOT NULL,
+    url TEXT NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT,
+    PRIMARY KEY (site, url, start)
+);
+CREATE INDEX IF NOT EXISTS idx_url_presence_start ON url_presence (site, start);
+CREATE INDEX IF NOT EXISTS idx_url_presence_open ON url_presence (site, url) WHERE end IS NULL;
+CREATE TABLE IF NOT EXISTS url_presence_state (
+    site TEXT PRIMARY KEY,
+    last_applied TEXT NOT NULL
+);
+"""
+
+def connect_index(path):
+    """
+    打开（必要时创建）索引数据库。索引文件随数据一起提交，使用默认的回滚日志模式保持单个文件
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.executescript(SCHEMA)
+    return conn
+
+def format_time(when):
+    """
+    把 datetime 或变更日志中的 'YYYYMMDDTHHMMSS' 转换为索引使用的时间字符串
+    """
+    if isinstance(when, str):
+        when = datetime.strptime(when, CHANGELOG_TIME_FORMAT)
+    return when.strftime(TIME_FORMAT)
+
+def changelog_time(value):
+    """
+    把索引使用的时间字符串转换为变更日志中的 'YYYYMMDDTHHMMSS'，None 保持为 None
+    """
+    if value is None:
+        return None
+    return datetime.strptime(value, TIME_FORMAT).strftime(CHANGELOG_TIME_FORMAT)
+
+def last_applied(conn, site):
+    """
+    站点最后一次写入索引的变更时间，站点还没有建立索引时返回None
+    """
+    row = conn.execute("SELECT last_applied FROM url_presence_state WHERE site = ?", (site,)).fetchone()
+    return row[0] if row else None
+
+def _open_urls(cursor, site, when, urls):
+    cursor.executemany("""
+        INSERT INTO url_presence (site, url, start)
+        SELECT ?, ?, ?
+        WHERE NOT EXISTS (SELECT 1 FROM url_presence WHERE site = ? AND url = ? AND end IS NULL)
+    """, ((site, url, when, site, url) for url in urls))
+
+def _close_urls(cursor, site, when, urls):
+    cursor.executemany("UPDATE url_presence SET end = ? WHERE site = ? AND url = ? AND end IS NULL",
+                       ((when, site, url) for url in urls))
+
+def _close_unknown(cursor, site, first_seen, when, urls):
+    # 变更日志开始之前就已存在的URL被删除时，以最早观测时间作为开始时间补一个区间
+    cursor.executemany("""
+        INSERT INTO url_presence (site, url, start, end)
+        SELECT ?, ?, ?, ?
+        WHERE NOT EXISTS (SELECT 1 FROM url_presence WHERE site = ? AND url = ?)
+    """, ((site, url, first_seen, when, site, url) for url in urls))
+
+def _set_applied(cursor, site, when):
+    cursor.execute("""
+        INSERT INTO url_presence_state (site, last_applied) VALUES (?, ?)
+        ON CONFLICT(site) DO UPDATE SET last_applied = excluded.last_applied
+    """, (site, when))
+
+def apply_change(conn, site, when, added_urls, deleted_urls):
+    """
+    把一条变更记录写入索引：新增的URL开启在线区间，删除的URL结束在线区间
+    早于已写入时间的记录会被跳过，同一条记录重复写入不会改变结果
+
+    Args:
+        conn: 索引数据库连接
+        site: 站点名称
+        when: 变更时间（datetime 或 'YYYYMMDDTHHMMSS'）
+        added_urls: 新增的URL
+        deleted_urls: 删除的URL
+
+    Returns:
+        是否写入了索引
+    """
+    when = format_time(when)
+    applied = last_applied(conn, site)
+    if applied is not None and when < applied:
+        return False
+    with conn:
+        cursor = conn.cursor()
+        _close_urls(cursor, site, when, deleted_urls)
+        # 和 rebuild_site 一致：从未出现过的URL被删除时，以最早观测时间补一个区间
+        first_seen = cursor.execute("SELECT MIN(start) FROM url_presence WHERE site = ?", (site,)).fetchone()[0]
+        _close_unknown(cursor, site, first_seen or when, when, deleted_urls)
+        _open_urls(cursor, site, when, added_urls)
+        _set_applied(cursor, site, when)
+    return True
+
+def _read_changelog(path, since=None):
+    from .changelog import iter_records
+
+    return sorted((record for _, record in iter_records(path, since)), key=lambda record: record['datetime'])
+
+def sync_site(conn, site, changelog_path):
+    """
+    把变更日志中不早于最后写入时间的记录依次写入索引（之前写入失败的变更会在这里补上）
+
+    Returns:
+        写入的记录数
+    """
+    applied = 0
+    for record in _read_changelog(changelog_path, changelog_time(last_applied(conn, site))):
+        if apply_change(conn, site, record['datetime'], record['added_urls'], record['deleted_urls']):
+            applied += 1
+    return applied
+
+def rebuild_site(conn, site, changelog_path, sitemap_path):
+    """
+    根据变更日志和最早的快照重建站点的索引（只在首次建立或修复索引时使用）
+
+    最早快照中的URL在此之前的上线时间未知，以最早的观测时间作为开始时间；
+    回放到最早快照时仍在线、但快照中不存在的URL在快照时间结束
+
+    Args:
+        conn: 索引数据库连接
+        site: 站点名称
+        changelog_path: 站点的变更日志文件（{site}.jsonl）
+        sitemap_path: 快照目录
+
+    Returns:
+        索引中该站点的区间数
+    """
+    from .snapshots import list_snapshots, load_snapshot_urls
+
+    records = _read_changelog(changelog_path)
+    files = list_snapshots(site, sitemap_path)
+    base_time = format_time(snapshot_time(files[0])) if files else None
+    base_urls = load_snapshot_urls(sitemap_path, files[0], files) if files else set()
+
+    times = [format_time(record['datetime']) for record in records]
+    first_seen = min(times[:1] + ([base_time] if base_time else []), default=None)
+
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM url_presence WHERE site = ?", (site,))
+        cursor.execute("DELETE FROM url_presence_state WHERE site = ?", (site,))
+        seeded = base_time is None
+        for when, record in zip(times, records):
+            if not seeded and when > base_time:
+                _seed(cursor, site, first_seen, base_time, base_urls)
+                seeded = True
+            _close_urls(cursor, site, when, record['deleted_urls'])
+            _close_unknown(cursor, site, first_seen, when, record['deleted_urls'])
+            _open_urls(cursor, site, when, record['added_urls'])
+        if not seeded:
+            _seed(cursor, site, first_seen, base_time, base_urls)
+        last = max(times[-1:] + ([base_time] if base_time else []), default=None)
+        if last is not None:
+            _set_applied(cursor, site, last)
+        return cursor.execute("SELECT COUNT(*) FROM url_presence WHERE site = ?", (site,)).fetchone()[0]
+
+def _seed(cursor, site, first_seen, base_time, base_urls):
+    open_urls = {row[0] for row in cursor.execute(
+        "SELECT url FROM url_presence WHERE site = ? AND end IS NULL", (site,))}
+    seen_urls = {row[0] for row in cursor.execute(
+        "SELECT DISTINCT url FROM url_presence WHERE site = ?", (site,))}
+    _close_urls(cursor, site, base_time, open_urls - base_urls)
+    # 之前从未出现过的URL从最早观测时间开始，出现过但已下线的URL从快照时间重新开始
+    _open_urls(cursor, site, first_seen, base_urls - seen_urls)
+    _open_urls(cursor, site, base_time, (base_urls & seen_urls) - open_urls)
+
+def url_history(conn, site, url):
+    """
+    URL的所有在线区间，按开始时间排序
+
+    Returns:
+        [(start, end), ...]，end 为None表示目前仍在线
+    """
+    return conn.execute("SELECT start, end FROM url_presence WHERE site = ? AND url = ? ORDER BY start",
+                        (site, url)).fetchall()
+
+def short_lived(conn, site, max_days=7):
+    """
+    已下线且从首次出现到最后下线不足 max_days 天的URL
+    开始观测时就已存在的URL真实上线时间未知，不计入
+
+    Returns:
+        [(url, first_seen, last_seen), ...]，按首次出现时间排序
+    """
+    return conn.execute("""
+        SELECT url, MIN(start) AS first_seen, MAX(end) AS last_seen
+        FROM url_presence
+        WHERE site = ?
+        GROUP BY url
+        HAVING COUNT(end) = COUNT(*) AND julianday(MAX(end)) - julianday(MIN(start)) < ?
+           AND MIN(start) > (SELECT MIN(start) FROM url_presence WHERE site = ?)
+        ORDER BY first_seen, url
+    """, (site, max_days, site)).fetchall()
+
+def live_count_at(conn, site, when):
+    """
+    指定时间点（datetime）站点在线的URL数量
+    """
+    when = format_time(when)
+    return conn.execute("""
+        SELECT COUNT(*) FROM url_presence
+        WHERE site = ? AND start <= ? AND (end IS NULL OR end > ?)
+    """, (site, when, when)).fetchone()[0]
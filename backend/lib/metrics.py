@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# 耗时直方图的桶上限（毫秒），最后一个桶收集所有更慢的样本
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, float('inf')]
+
+
+class Metrics:
+    """
+    进程内的抓取指标：按阶段统计耗时直方图，并记录计数器，
+    只保留最近 window 秒的数据用于计算速率和分位数
+
+    Args:
+        window: 滚动窗口长度（秒）
+        slot: 窗口内每个时间片的长度（秒）
+        ratios: 由计数器派生的比率，{名称: (分子计数器列表, 分母计数器列表)}，按窗口内的值计算
+    """
+
+    def __init__(self, window=300, slot=10, ratios=None):
+        self.window = window
+        self.slot = slot
+        self.ratios = ratios or {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._timings = {}  # stage -> deque([slot_id, 桶计数列表, 总耗时, 次数])
+        self._counters = {}  # name -> deque([slot_id, 次数])
+        self._totals = {}
+
+    def _current(self, series, make):
+        slot_id = int(time.time() // self.slot)
+        if not series or series[-1][0] != slot_id:
+            series.append(make(slot_id))
+        while series and series[0][0] <= slot_id - self.window // self.slot:
+            series.popleft()
+        return series[-1]
+
+    def observe(self, stage, seconds):
+        """
+        记录某个阶段一次执行的耗时
+        """
+        ms = seconds * 1000
+        index = next(i for i, bound in enumerate(BUCKETS_MS) if ms <= bound)
+        with self._lock:
+            series = self._timings.setdefault(stage, deque())
+            current = self._current(series, lambda slot_id: [slot_id, [0] * len(BUCKETS_MS), 0.0, 0])
+            current[1][index] += 1
+            current[2] += seconds
+            current[3] += 1
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def incr(self, name, n=1):
+        with self._lock:
+            series = self._counters.setdefault(name, deque())
+            self._current(series, lambda slot_id: [slot_id, 0])[1] += n
+            self._totals[name] = self._totals.get(name, 0) + n
+
+    @staticmethod
+    def _percentile(buckets, count, q):
+        target = count * q
+        seen = 0
+        for bound, n in zip(BUCKETS_MS, buckets):
+            seen += n
+            if seen >= target:
+                return bound
+        return BUCKETS_MS[-1]
+
+    def snapshot(self):
+        """
+        返回当前指标：各阶段窗口内的次数、平均耗时、分位数和直方图，各计数器的总数和每秒速率
+        """
+        now = time.time()
+        oldest = int(now // self.slot) - self.window // self.slot
+        elapsed = min(self.window, now - self.started) or 1
+        with self._lock:
+            stages = {}
+            for stage, series in self._timings.items():
+                buckets = [0] * len(BUCKETS_MS)
+                total, count = 0.0, 0
+                for slot_id, slot_buckets, slot_total, slot_count in series:
+                    if slot_id <= oldest:
+                        continue
+                    buckets = [a + b for a, b in zip(buckets, slot_buckets)]
+                    total += slot_total
+                    count += slot_count
+                stages[stage] = {
+                    'count': count,
+                    'mean_ms': round(total / count * 1000, 3) if count else None,
+                    'p50_ms': self._percentile(buckets, count, 0.5) if count else None,
+                    'p90_ms': self._percentile(buckets, count, 0.9) if count else None,
+                    'p99_ms': self._percentile(buckets, count, 0.99) if count else None,
+                    'histogram_ms': {str(bound): n for bound, n in zip(BUCKETS_MS, buckets) if n},
+                }
+            counters = {}
+            for name, series in self._counters.items():
+                recent = sum(n for slot_id, n in series if slot_id > oldest)
+                counters[name] = {
+                    'total': self._totals[name],
+                    'window': recent,
+                    'per_sec': round(recent / elapsed, 3),
+                }
+        ratios = {}
+        for name, (numerators, denominators) in self.ratios.items():
+            numerator = sum(counters.get(c, {}).get('window', 0) for c in numerators)
+            denominator = sum(counters.get(c, {}).get('window', 0) for c in denominators)
+            ratios[name] = round(numerator / denominator, 4) if denominator else None
+        return {
+            'time': round(now, 3),
+            'uptime': round(now - self.started, 1),
+            'window': self.window,
+            'stages': stages,
+            'counters': counters,
+            'ratios': ratios,
+        }
+
+    def write(self, path):
+        """
+        把当前指标写入JSON文件（先写临时文件再替换）
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def start_reporter(self, path, interval=30):
+        """
+        启动后台线程，定期把指标写入文件
+        """
+        def report():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.write(path)
+                except OSError as e:
+                    print(f"写入指标文件失败: {e}")
+
+        thread = threading.Thread(target=report, name='metrics-reporter', daemon=True)
+        thread.start()
+        return thread
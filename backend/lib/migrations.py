@@ -0,0 +1,138 @@
+import sqlite3
+
+# 数据库结构版本记录在 PRAGMA user_version 中，每个迁移在单独的事务中执行并更新版本号；
+# 迁移只做追加（加列、加索引、加触发器、回填数据），可以在抓取程序和API运行时执行
+
+def _columns(cursor, table):
+    return [row[1] for row in cursor.execute(f'PRAGMA table_info({table})')]
+
+def _add_missing_columns(cursor):
+    """
+    旧数据库补充后来新增的列
+    """
+    if 'confirmed_time' not in _columns(cursor, 'games_rating_poki'):
+        cursor.execute('ALTER TABLE games_rating_poki ADD COLUMN confirmed_time TIMESTAMP')
+    columns = _columns(cursor, 'crawl_frontier_poki')
+    if 'lease_owner' not in columns:
+        cursor.execute('ALTER TABLE crawl_frontier_poki ADD COLUMN lease_owner TEXT')
+    if 'lease_expires' not in columns:
+        cursor.execute('ALTER TABLE crawl_frontier_poki ADD COLUMN lease_expires REAL')
+
+def _add_query_indexes(cursor):
+    """
+    为API和抓取程序的查询添加覆盖索引
+    """
+    # 评分历史按游戏查询并按时间排序，MAX(id) GROUP BY game_id 也可以只扫描索引
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_games_rating_poki_game_time
+    ON games_rating_poki (game_id, fetch_time, up_count, down_count, confirmed_time)
+    ''')
+    # 按分类分组统计游戏数、列出所有分类
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_game_categories_poki_category
+    ON game_categories_poki (category, game_id)
+    ''')
+    # 新增游戏统计和趋势按抓取时间过滤
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_games_poki_fetch_time
+    ON games_poki (fetch_time)
+    ''')
+
+def _add_rating_columns(cursor):
+    """
+    games_poki 增加 positive_ratio（好评率）和 total_votes（总评分数）两列，
+    由触发器在写入和更新评分时维护，排序和排行榜可以直接使用索引
+    """
+    columns = _columns(cursor, 'games_poki')
+    if 'positive_ratio' not in columns:
+        cursor.execute('ALTER TABLE games_poki ADD COLUMN positive_ratio REAL')
+    if 'total_votes' not in columns:
+        cursor.execute('ALTER TABLE games_poki ADD COLUMN total_votes INTEGER')
+
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_games_poki_rating_insert
+    AFTER INSERT ON games_poki
+    BEGIN
+        UPDATE games_poki
+        SET positive_ratio = NEW.up_count * 1.0 / (NEW.up_count + NEW.down_count + 1),
+            total_votes = NEW.up_count + NEW.down_count
+        WHERE id = NEW.id;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_games_poki_rating_update
+    AFTER UPDATE OF up_count, down_count ON games_poki
+    BEGIN
+        UPDATE games_poki
+        SET positive_ratio = NEW.up_count * 1.0 / (NEW.up_count + NEW.down_count + 1),
+            total_votes = NEW.up_count + NEW.down_count
+        WHERE id = NEW.id;
+    END
+    ''')
+
+    # 回填已有数据
+    cursor.execute('''
+    UPDATE games_poki
+    SET positive_ratio = up_count * 1.0 / (up_count + down_count + 1),
+        total_votes = up_count + down_count
+    ''')
+
+    # 游戏列表按 (positive_ratio DESC, id) 排序；排行榜只包含评分数超过10的游戏
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_games_poki_ratio
+    ON games_poki (positive_ratio DESC, id)
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_games_poki_ranking
+    ON games_poki (positive_ratio DESC, up_count DESC)
+    WHERE total_votes > 10
+    ''')
+
+# (版本号, 说明, 迁移函数)，只能在末尾追加
+MIGRATIONS = [
+    (1, '补充 confirmed_time 和抓取租约列', _add_missing_columns),
+    (2, '添加查询索引', _add_query_indexes),
+    (3, '添加 positive_ratio / total_votes 列及索引', _add_rating_columns),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+# 从该版本开始 games_rating_poki 有 confirmed_time 列
+CONFIRMED_TIME_VERSION = 1
+# 从该版本开始 games_poki 有 positive_ratio / total_votes 列
+RATING_COLUMNS_VERSION = 3
+
+def get_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(conn, target=LATEST_VERSION):
+    """
+    把数据库升级到 target 版本，已执行过的迁移会跳过
+
+    每个迁移使用 BEGIN IMMEDIATE 获取写锁后再检查版本号，多个进程同时启动时只有一个会执行；
+    迁移失败时回滚该迁移，版本号保持不变
+
+    Args:
+        conn: 数据库连接（表结构已创建）
+        target: 目标版本
+
+    Returns:
+        升级后的版本号
+    """
+    if conn.in_transaction:
+        conn.commit()
+    for version, _, apply in MIGRATIONS:
+        if version > target or get_version(conn) >= version:
+            continue
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # 等待写锁期间可能已被其他进程升级
+            if get_version(conn) >= version:
+                conn.rollback()
+                continue
+            apply(conn.cursor())
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+    return get_version(conn)
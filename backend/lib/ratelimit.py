@@ -0,0 +1,73 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    """
+    令牌桶限速器，线程安全
+
+    Args:
+        rate: 每秒补充的令牌数（即稳定状态下的请求速率）
+        capacity: 桶容量，允许的最大突发请求数，默认等于rate（至少为1）
+    """
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("rate必须大于0")
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, tokens=1):
+        """
+        获取令牌，令牌不足时阻塞等待
+
+        Returns:
+            本次等待的秒数
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class HostRateLimiter:
+    """
+    按域名分配令牌桶，不同域名之间的请求互不影响
+
+    Args:
+        rate: 每个域名每秒允许的请求数
+        burst: 每个域名允许的最大突发请求数
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate, self.burst)
+            return self._buckets[host]
+
+    def acquire(self, url):
+        """
+        为指定URL所在的域名获取一个令牌
+        """
+        return self.bucket(url).acquire()
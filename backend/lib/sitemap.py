@@ -1,38 +1,175 @@
+import gzip
+import hashlib
+import io
 import os
-from datetime import datetime
-from bs4 import BeautifulSoup
+import time
+
+import requests
+from lxml import etree
+
+GZIP_MAGIC = b'\x1f\x8b'
 
 def find_latest_sitemap(site, sitemap_path):
     """
-    查找指定站点最新的sitemap文件
+    查找指定站点最新的sitemap文件，通过快照目录清单二分查找，不再扫描目录
     
     Args:
         site: 站点名称
         sitemap_path: sitemap文件存储路径，默认为'data/sitemap'
         
     Returns:
-        最新sitemap的时间对象，如果没有找到则返回None
-    """
-    files = os.listdir(sitemap_path)
-    last_time, last_file = None, None
-    for file in files:
-        if file.startswith(site):
-            [_, date, time] = file.split('.')[0].split('_')
-            last_file = file
-            # 最新时间
-            if last_time is None:
-                last_time = datetime.strptime(f"{date}_{time}", "%Y%m%d_%H%M%S")
-            else:
-                last_time = max(last_time, datetime.strptime(f"{date}_{time}", "%Y%m%d_%H%M%S"))
-    return last_file, last_time
+        (最新sitemap文件名, 时间对象)，如果没有找到则返回 (None, None)
+    """
+    from .catalog import get_catalog, snapshot_time
+
+    last_file = get_catalog(sitemap_path).latest(site)
+    if last_file is None:
+        return None, None
+    return last_file, snapshot_time(last_file)
+
+class DeadlineReader(io.RawIOBase):
+    """
+    为下载中的响应加上截止时间：超过 deadline（time.monotonic()）后读取时抛出 TimeoutError
+    """
+
+    def __init__(self, raw, deadline, url):
+        self.raw = raw
+        self.deadline = deadline
+        self.url = url
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if time.monotonic() > self.deadline:
+            raise TimeoutError(f"下载 {self.url} 超时")
+        data = self.raw.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.raw.close()
+        super().close()
+
+def fetch_stream(url, client=None, deadline=None):
+    """
+    以流的方式下载远程sitemap，返回可读的文件对象
+    
+    Args:
+        url: sitemap地址
+        client: HttpClient 实例，复用其连接池；为None时单独发送请求
+        deadline: time.monotonic() 的截止时间，超过后放弃下载并抛出 TimeoutError
+    """
+    if deadline is None:
+        timeout = 60
+    else:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            raise TimeoutError(f"下载 {url} 超时")
+    if client is None:
+        res = requests.get(url, stream=True, timeout=timeout)
+        res.raise_for_status()
+    else:
+        # 子sitemap的内容要写入完整快照，304时没有可读的内容，因此不发送条件请求
+        res = client.get(url, conditional=False, stream=True, timeout=timeout)
+    res.raw.decode_content = True
+    # 读完后 urllib3 会把响应标记为已关闭，外层的缓冲区中还有未解析的数据，由调用方关闭
+    res.raw.auto_close = False
+    return res.raw if deadline is None else DeadlineReader(res.raw, deadline, url)
+
+def open_sitemap(source, fetch=fetch_stream):
+    """
+    打开sitemap：支持本地路径、URL、bytes 和文件对象，gzip压缩的内容自动解压
+    """
+    if isinstance(source, (bytes, bytearray)):
+        stream = io.BytesIO(source)
+    elif hasattr(source, 'read'):
+        stream = source
+    elif source.startswith(('http://', 'https://')):
+        stream = fetch(source)
+    else:
+        stream = open(source, 'rb')
+
+    if not hasattr(stream, 'peek'):
+        stream = io.BufferedReader(stream)
+    if stream.peek(2)[:2] == GZIP_MAGIC:
+        stream = gzip.GzipFile(fileobj=stream)
+    return stream
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else None
+
+def iter_sitemap_urls(source, fetch=fetch_stream, follow_index=True):
+    """
+    逐条读取sitemap中<url>下的<loc>，已处理的元素会立即释放，内存占用与文件大小无关
+    
+    Args:
+        source: 本地路径、URL、bytes 或文件对象，支持 .xml.gz
+        fetch: 下载远程sitemap的函数，用于读取<sitemapindex>中的子sitemap
+        follow_index: 遇到<sitemapindex>时是否继续读取其中的子sitemap
+        
+    Yields:
+        URL字符串
+    """
+    stream = open_sitemap(source, fetch)
+    try:
+        for _, elem in etree.iterparse(stream, events=('end',), resolve_entities=False, no_network=True):
+            name = _local_name(elem.tag)
+            if name == 'loc':
+                parent = _local_name(elem.getparent().tag) if elem.getparent() is not None else None
+                text = (elem.text or '').strip()
+                if parent == 'url' and text:
+                    yield text
+                elif parent == 'sitemap' and text and follow_index:
+                    yield from iter_sitemap_urls(text, fetch, follow_index)
+            elif name in ('url', 'sitemap'):
+                # 释放已经处理完的元素及之前的兄弟节点
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+    finally:
+        if stream is not source:
+            stream.close()
 
 def get_game_urls(path):
     """
-    获取指定站点的所有游戏URL
+    获取指定站点的所有游戏URL，path 可以是原始sitemap，也可以是完整/增量快照
+    """
+    from .snapshots import DELTA_SUFFIX, FULL_SUFFIX, load_snapshot_urls
+
+    if path.endswith((FULL_SUFFIX, DELTA_SUFFIX)):
+        return sorted(load_snapshot_urls(os.path.dirname(path) or '.', os.path.basename(path)))
+    return list(iter_sitemap_urls(path))
+
+
+def file_fingerprint(path, chunk_size=1 << 20):
+    """
+    计算文件内容的SHA-256指纹
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def diff_url_sets(old_urls, new_urls):
+    """
+    计算两组URL的差异，线性时间
+    
+    Returns:
+        (新增的URL列表, 删除的URL列表)，均已排序
+    """
+    old_set, new_set = set(old_urls), set(new_urls)
+    return sorted(new_set - old_set), sorted(old_set - new_set)
+
+def diff_sitemaps(old_path, new_path):
+    """
+    对比两个sitemap文件，内容完全相同（指纹一致）时不再解析
+    
+    Returns:
+        (新增的URL列表, 删除的URL列表)
     """
-    with open(f"{path}", "r") as f:
-        sitemap_content = f.read()
-    soup = BeautifulSoup(sitemap_content, 'xml')
-    # 直接匹配<url>标签下的<loc>标签
-    loc_tags = soup.select('url > loc')
-    return [tag.text for tag in loc_tags]
\ No newline at end of file
+    if file_fingerprint(old_path) == file_fingerprint(new_path):
+        return [], []
+    return diff_url_sets(iter_sitemap_urls(old_path), iter_sitemap_urls(new_path))
@@ -0,0 +1,187 @@
+import gzip
+import os
+
+from .catalog import DELTA_SUFFIX, FULL_SUFFIX, RAW_SUFFIXES, get_catalog, parse_snapshot_name
+from .sitemap import diff_url_sets, file_fingerprint, iter_sitemap_urls
+
+# 两个完整快照之间最多保存的增量快照数
+FULL_EVERY = 24
+
+def is_delta(filename):
+    return filename.endswith(DELTA_SUFFIX)
+
+def list_snapshots(site, sitemap_path):
+    """
+    列出指定站点的所有快照文件，按时间从旧到新排序
+    """
+    return get_catalog(sitemap_path).files(site)
+
+def _write_lines(path, lines):
+    # 固定mtime并且不写入文件名（否则会写入临时文件名），内容相同的快照压缩结果也相同
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as raw, gzip.GzipFile(filename='', fileobj=raw, mode='wb', mtime=0) as f:
+        for line in lines:
+            f.write(line.encode('utf-8') + b'\n')
+    os.replace(tmp_path, path)
+
+def _read_lines(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line:
+                yield line
+
+def read_delta(path):
+    """
+    读取增量快照
+    
+    Returns:
+        (新增的URL列表, 删除的URL列表)
+    """
+    added, deleted = [], []
+    for line in _read_lines(path):
+        (added if line[0] == '+' else deleted).append(line[1:])
+    return added, deleted
+
+def read_base(path):
+    """
+    读取完整快照（新格式或原始sitemap）的URL集合
+    """
+    if path.endswith(FULL_SUFFIX):
+        return set(_read_lines(path))
+    return set(iter_sitemap_urls(path))
+
+def load_snapshot_urls(sitemap_path, filename, files=None):
+    """
+    还原某个快照时刻的URL集合：从之前最近的完整快照开始依次应用增量
+    
+    Args:
+        sitemap_path: 快照目录
+        filename: 快照文件名
+        files: 该站点按时间排序的快照文件列表，不传时扫描目录
+    """
+    if files is None:
+        files = list_snapshots(parse_snapshot_name(filename)[0], sitemap_path)
+    index = files.index(filename)
+    base = index
+    while base >= 0 and is_delta(files[base]):
+        base -= 1
+    if base < 0:
+        raise ValueError(f"{filename} 之前没有完整快照")
+
+    urls = read_base(os.path.join(sitemap_path, files[base]))
+    for delta in files[base + 1:index + 1]:
+        added, deleted = read_delta(os.path.join(sitemap_path, delta))
+        urls.difference_update(deleted)
+        urls.update(added)
+    return urls
+
+def write_snapshot(site, sitemap_path, stamp, urls, full_every=FULL_EVERY):
+    """
+    保存一个快照：没有历史快照或距离上一个完整快照已有 full_every 个增量时保存完整快照，
+    否则只保存相对上一个快照的增量
+    
+    Args:
+        site: 站点名称
+        sitemap_path: 快照目录
+        stamp: 时间戳字符串 YYYYMMDD_HHMMSS
+        urls: URL可迭代对象
+        
+    Returns:
+        写入的文件名
+    """
+    urls = set(urls)
+    files = list_snapshots(site, sitemap_path)
+
+    chain = 0
+    for filename in reversed(files):
+        if not is_delta(filename):
+            break
+        chain += 1
+
+    if not files or chain + 1 >= full_every:
+        filename = f"{site}_{stamp}{FULL_SUFFIX}"
+        _write_lines(os.path.join(sitemap_path, filename), sorted(urls))
+    else:
+        previous = load_snapshot_urls(sitemap_path, files[-1], files)
+        added, deleted = diff_url_sets(previous, urls)
+        filename = f"{site}_{stamp}{DELTA_SUFFIX}"
+        _write_lines(os.path.join(sitemap_path, filename),
+                     [f"+{url}" for url in added] + [f"-{url}" for url in deleted])
+    get_catalog(sitemap_path).add(filename)
+    return filename
+
+def remove_snapshot(sitemap_path, filename):
+    """
+    删除快照文件并从目录清单中移除
+    """
+    os.remove(os.path.join(sitemap_path, filename))
+    get_catalog(sitemap_path).remove(filename)
+
+def diff_snapshots(sitemap_path, old_file, new_file, files=None):
+    """
+    对比相邻的两个快照：新快照是增量时直接读取增量，
+    两个都是完整快照且文件内容相同时不再解析
+    
+    Returns:
+        (新增的URL列表, 删除的URL列表)
+    """
+    new_path = os.path.join(sitemap_path, new_file)
+    if is_delta(new_file):
+        added, deleted = read_delta(new_path)
+        return sorted(added), sorted(deleted)
+
+    old_path = os.path.join(sitemap_path, old_file)
+    if not is_delta(old_file) and file_fingerprint(old_path) == file_fingerprint(new_path):
+        return [], []
+    return diff_url_sets(load_snapshot_urls(sitemap_path, old_file, files),
+                         load_snapshot_urls(sitemap_path, new_file, files))
+
+def urls_at(site, sitemap_path, when):
+    """
+    还原指定时间点（datetime）站点的URL集合，该时间之前没有快照时返回None
+    """
+    filename = get_catalog(sitemap_path).at(site, when)
+    if filename is None:
+        return None
+    return load_snapshot_urls(sitemap_path, filename)
+
+def pack_snapshots(site, sitemap_path, full_every=FULL_EVERY):
+    """
+    把站点已有的原始sitemap文件转换为完整快照+增量快照，转换成功后删除原始文件
+    
+    Returns:
+        转换的文件数
+    """
+    catalog = get_catalog(sitemap_path)
+    files = catalog.files(site)
+    previous, chain, packed = None, 0, 0
+    for filename in files:
+        path = os.path.join(sitemap_path, filename)
+        if is_delta(filename):
+            if previous is None:
+                raise ValueError(f"{filename} 之前没有完整快照")
+            added, deleted = read_delta(path)
+            urls = (previous - set(deleted)) | set(added)
+        else:
+            urls = read_base(path)
+        stamp = parse_snapshot_name(filename)[1]
+
+        if filename.endswith(RAW_SUFFIXES):
+            if previous is None or chain + 1 >= full_every:
+                packed_file = f"{site}_{stamp}{FULL_SUFFIX}"
+                _write_lines(os.path.join(sitemap_path, packed_file), sorted(urls))
+                chain = 0
+            else:
+                added, deleted = diff_url_sets(previous, urls)
+                packed_file = f"{site}_{stamp}{DELTA_SUFFIX}"
+                _write_lines(os.path.join(sitemap_path, packed_file),
+                             [f"+{url}" for url in added] + [f"-{url}" for url in deleted])
+                chain += 1
+            catalog.add(packed_file)
+            remove_snapshot(sitemap_path, filename)
+            packed += 1
+        else:
+            chain = chain + 1 if is_delta(filename) else 0
+        previous = urls
+    return packed
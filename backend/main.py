@@ -1,23 +1,63 @@
-import requests
+import argparse
+import functools
 import os
-import json
-from bs4 import BeautifulSoup
+import tempfile
+import time
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from backend.lib.data import load_config
-from backend.lib.sitemap import find_latest_sitemap, get_game_urls
+from backend.lib.changelog import append_record, changelog_file
+from backend.lib.events import backfill_events, connect_events, sync_events
+from backend.lib.httpclient import HttpClient, ValidatorCache
+from backend.lib.lifetime import last_applied, rebuild_site, sync_site
+from backend.lib.sitemap import fetch_stream, find_latest_sitemap, iter_sitemap_urls
+from backend.lib.snapshots import diff_snapshots, list_snapshots, pack_snapshots, remove_snapshot, write_snapshot
 
 config = load_config()
 SITEMAP_PATH = config['sitemap_path']
+HTTP_CACHE_PATH = os.path.join(config.get('http_cache_path', 'data/http_cache'), 'sitemaps.json')
+# URL生命周期索引
+INDEX_DB = config.get('index_db', 'data/index.db')
+# 单个站点抓取的最长时间（秒），超时只影响该站点
+SITE_TIMEOUT = config.get('site_timeout', 300)
 
-def fetch_sitemap(url):
-    res = requests.get(url)
-    res.raise_for_status()
-    return res.text
+http_client = HttpClient(validators=ValidatorCache(HTTP_CACHE_PATH))
+
+def fetch_sitemap(url, path, deadline=None):
+    """
+    抓取sitemap并以流的方式写入文件，不在内存中保留整个文件
+    
+    Args:
+        url: sitemap地址
+        path: 保存路径
+        deadline: time.monotonic() 的截止时间，超过后放弃下载并抛出 TimeoutError
+    
+    Returns:
+        写入成功返回响应对象，内容自上次抓取后未变化（304）时返回None
+        响应的校验信息由调用方在记录变更之后通过 http_client.remember 保存
+    """
+    timeout = SITE_TIMEOUT if deadline is None else max(1, deadline - time.monotonic())
+    res = http_client.get(url, stream=True, timeout=timeout)
+    if res is None:
+        return None
+    res.raw.decode_content = True
+    # 先写临时文件，下载中断时不会留下不完整的sitemap
+    tmp_path = f"{path}.tmp"
+    try:
+        with res, open(tmp_path, 'wb') as f:
+            for chunk in iter(lambda: res.raw.read(1 << 16), b''):
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeoutError(f"下载 {url} 超时")
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return res
 
 def parse_urls(sitemap_xml):
-    soup = BeautifulSoup(sitemap_xml, 'xml')
-    urls = [loc.text.strip() for loc in soup.find_all('loc')]
-    return urls
+    return list(iter_sitemap_urls(sitemap_xml.encode() if isinstance(sitemap_xml, str) else sitemap_xml))
 
 def clean_duplicate_sitemaps(site, sitemap_path):
     """
@@ -30,18 +70,8 @@ def clean_duplicate_sitemaps(site, sitemap_path):
     Returns:
         删除的文件数量
     """
-    # 获取指定站点的所有sitemap文件
-    files = [f for f in os.listdir(sitemap_path) if f.startswith(site) and f.endswith('.xml')]
-    
-    # 按时间排序文件（从旧到新）
-    def extract_datetime(filename):
-        parts = filename.split('.')[0].split('_')
-        if len(parts) >= 3:
-            date, time = parts[1], parts[2]
-            return datetime.strptime(f"{date}_{time}", "%Y%m%d_%H%M%S")
-        return datetime.min
-    
-    files.sort(key=extract_datetime)
+    # 获取指定站点的所有快照文件（从旧到新）
+    files = list_snapshots(site, sitemap_path)
     
     # 如果文件数量小于2，无需比较
     if len(files) < 2:
@@ -50,48 +80,146 @@ def clean_duplicate_sitemaps(site, sitemap_path):
     
     deleted_count = 0
     
-    # 对比最新的两个文件
-    new_urls = sorted(get_game_urls(os.path.join(sitemap_path, files[-1])))
-    old_urls = sorted(get_game_urls(os.path.join(sitemap_path, files[-2])))
-    added_urls = [url for url in new_urls if url not in old_urls]
-    deleted_urls = [url for url in old_urls if url not in new_urls]
+    # 对比最新的两个快照，新快照是增量时直接读取，完整快照内容相同时跳过解析
+    added_urls, deleted_urls = diff_snapshots(sitemap_path, files[-2], files[-1], files)
 
     if len(deleted_urls) == 0 and len(added_urls) == 0:
         print(f"文件内容相同: {files[-1]} 和 {files[-2]}，删除较新的文件")
-        os.remove(os.path.join(sitemap_path, files[-1]))
+        remove_snapshot(sitemap_path, files[-1])
         deleted_count += 1
     else:
-        timestr = files[-1].split('.')[0].split('_')
-        with open(os.path.join(config['change_log_path'], f"{site}.jsonl"), 'a') as f:
-            f.write(json.dumps({
-                'datetime': f"{timestr[1]}T{timestr[2]}",
-                'deleted_urls': deleted_urls,
-                'added_urls': added_urls
-            }) + '\n')
+        timestr = files[-1].split('.')[0].rsplit('_', 2)
+        append_record(changelog_file(config['change_log_path'], site), {
+            'datetime': f"{timestr[1]}T{timestr[2]}",
+            'deleted_urls': deleted_urls,
+            'added_urls': added_urls
+        })
     
     return deleted_count
 
+def update_index_db(site):
+    """
+    把变更日志中尚未写入的记录写入索引数据库：变更事件表和URL生命周期索引，站点还没有数据时根据历史记录导入
+
+    只在主线程中调用，索引数据库不会被多个线程同时写入；
+    写入失败（如数据库被锁）时下次从上次写入的位置继续，不会丢失变更
+    """
+    changelog_path = changelog_file(config['change_log_path'], site)
+    with closing(connect_events(INDEX_DB)) as conn:
+        sync_events(conn, site, changelog_path)
+        if last_applied(conn, site) is None:
+            rebuild_site(conn, site, changelog_path, SITEMAP_PATH)
+        else:
+            sync_site(conn, site, changelog_path)
+
+def rebuild_url_index():
+    """
+    根据变更日志和快照重建所有站点的URL生命周期索引
+    """
+    with closing(connect_events(INDEX_DB)) as conn:
+        for target in config['sites']:
+            count = rebuild_site(conn, target['name'],
+                                 changelog_file(config['change_log_path'], target['name']), SITEMAP_PATH)
+            print(f"站点 {target['name']} 索引了 {count} 个在线区间")
+
+def backfill_change_events():
+    """
+    把所有站点已有的变更日志导入变更事件表
+    """
+    with closing(connect_events(INDEX_DB)) as conn:
+        for target in config['sites']:
+            count = backfill_events(conn, target['name'], changelog_file(config['change_log_path'], target['name']))
+            print(f"站点 {target['name']} 导入了 {count} 条变更事件")
+        # 大批量导入后更新统计信息，让查询规划器选择合适的索引
+        conn.execute("PRAGMA optimize")
+
+def collect_site(target):
+    """
+    抓取单个站点的sitemap，与上一次快照对比并记录变更
+    
+    Returns:
+        处理结果：skipped / not_modified / unchanged / changed
+    """
+    name, url = target['name'], target['url']
+    deadline = time.monotonic() + target.get('timeout', SITE_TIMEOUT)
+
+    # 获取最新的sitemap时间
+    _, last_time = find_latest_sitemap(name, config['sitemap_path'])
+    
+    # 如果时间在1小时内，则不抓取
+    if last_time and datetime.now() - last_time < timedelta(hours=1):
+        print(f"Last fetch time for {name} is less than 1 hour, skipping...")
+        return 'skipped'
+
+    print(f"Fetching sitemap for {name}...")
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # 原始sitemap只临时保存，解析后写入完整快照或增量快照
+        raw_path = os.path.join(tmp_dir, 'sitemap.xml.gz' if url.endswith('.gz') else 'sitemap.xml')
+        res = fetch_sitemap(url, raw_path, deadline)
+        if res is None:
+            print(f"Sitemap for {name} not modified, skipping...")
+            return 'not_modified'
+        # <sitemapindex> 中的子sitemap同样通过共享的连接池下载，并受该站点的截止时间限制
+        fetch = functools.partial(fetch_stream, client=http_client, deadline=deadline)
+        snapshot = write_snapshot(name, SITEMAP_PATH, stamp, iter_sitemap_urls(raw_path, fetch))
+        print(f"保存快照 {snapshot}")
+
+    deleted = clean_duplicate_sitemaps(name, config['sitemap_path'])
+    # 快照和变更都记录完成后才保存校验信息，中途失败时下次会重新下载完整的sitemap
+    http_client.remember(url, res)
+    if deleted > 0:
+        print(f"清理了 {deleted} 个重复的sitemap文件")
+        return 'unchanged'
+    return 'changed'
+
+def timed_collect(target):
+    """
+    执行 collect_site 并记录耗时，异常只影响当前站点
+    """
+    start = time.monotonic()
+    try:
+        status = collect_site(target)
+    except Exception as e:
+        print(f"抓取站点 {target['name']} 时出错: {e}")
+        status = f"error: {e}"
+    return status, time.monotonic() - start
+
 def main():
-    for target in config['sites']:
-        name, url = target['name'], target['url']
-        # 获取最新的sitemap时间
-        _, last_time = find_latest_sitemap(name, config['sitemap_path'])
-        
-        # 如果时间在1小时内，则不抓取
-        if last_time and datetime.now() - last_time < timedelta(hours=1):
-            print(f"Last fetch time for {name} is less than 1 hour, skipping...")
-            continue
+    sites = config['sites']
+    start = time.monotonic()
+
+    # 所有站点并行抓取，整体耗时取决于最慢的站点
+    with ThreadPoolExecutor(max_workers=max(1, len(sites))) as executor:
+        results = list(executor.map(timed_collect, sites))
 
-        print(f"Fetching sitemap for {name}...")
-        sitemap = fetch_sitemap(url)
+    # 抓取结束后在主线程中依次更新索引数据库
+    for target in sites:
+        try:
+            update_index_db(target['name'])
+        except Exception as e:
+            print(f"更新站点 {target['name']} 的索引数据库时出错: {e}")
 
-        # 保存到文件
-        with open(f'{SITEMAP_PATH}/{name}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xml', 'w') as f:
-            f.write(sitemap)
+    http_client.validators.save()
 
-        deleted = clean_duplicate_sitemaps(target['name'], config['sitemap_path'])
-        if deleted > 0:
-            print(f"清理了 {deleted} 个重复的sitemap文件")
+    print(f"全部站点处理完成，总耗时 {time.monotonic() - start:.1f} 秒")
+    for target, (status, elapsed) in zip(sites, results):
+        print(f"  {target['name']:<20} {elapsed:>8.1f}s  {status}")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='抓取站点sitemap并记录变更')
+    parser.add_argument('command', nargs='?', default='collect', choices=['collect', 'pack', 'rebuild-index', 'backfill-events'],
+                        help='collect: 抓取所有站点（默认）；pack: 把已有的原始sitemap文件转换为完整快照+增量快照；'
+                             'rebuild-index: 重建URL生命周期索引；backfill-events: 把变更日志导入变更事件表')
+    args = parser.parse_args()
+
+    if args.command == 'pack':
+        for target in config['sites']:
+            packed = pack_snapshots(target['name'], SITEMAP_PATH)
+            print(f"站点 {target['name']} 转换了 {packed} 个sitemap文件")
+    elif args.command == 'rebuild-index':
+        rebuild_url_index()
+    elif args.command == 'backfill-events':
+        backfill_change_events()
+    else:
+        main()
\ No newline at end of file
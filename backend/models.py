@@ -1,36 +1,109 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 
-from backend.database import execute_query, execute_query_one
+from backend.database import execute_queries, execute_query, execute_query_one, fetch_dicts, get_db_connection, schema_version
+from backend.lib.migrations import CONFIRMED_TIME_VERSION, RATING_COLUMNS_VERSION
+
+def _rating_sql() -> Dict[str, str]:
+    """
+    好评率和总评分数的SQL表达式：数据库已迁移时使用触发器维护的列（有索引），
+    抓取程序还没有迁移数据库时在查询中计算（结果相同，但不能使用索引）
+    """
+    if schema_version(RATING_COLUMNS_VERSION) >= RATING_COLUMNS_VERSION:
+        return {'ratio': 'positive_ratio', 'votes': 'total_votes'}
+    return {'ratio': '(up_count * 1.0 / (up_count + down_count + 1))', 'votes': '(up_count + down_count)'}
 
 class Game:
     @staticmethod
     def get_all(platform: str, limit: int, offset: int) -> List[Dict[str, Any]]:
         """获取所有游戏"""
         if platform == 'poki':
-            query = '''
+            query = f'''
                 SELECT g.id, g.title, g.description, g.up_count, g.down_count, g.url, g.fetch_time
                 FROM games_poki g
-                ORDER BY (g.up_count * 1.0 / (g.up_count + g.down_count + 1)) DESC
+                ORDER BY {_rating_sql()['ratio']} DESC, g.id
                 LIMIT ? OFFSET ?
             '''
             games = execute_query(query, (limit, offset))
-            
-            # 获取每个游戏的分类
-            for game in games:
-                categories_query = '''
-                    SELECT category FROM game_categories_poki WHERE game_id = ?
-                '''
-                categories = execute_query(categories_query, (game['id'],))
-                game['categories'] = [cat['category'] for cat in categories]
-            
+            Game._attach_categories(games)
             return games
         else:
             return []
 
+    @staticmethod
+    def _attach_categories(games: List[Dict[str, Any]]) -> None:
+        """一次查询取出本页所有游戏的分类"""
+        if not games:
+            return
+        categories_query = f'''
+            SELECT game_id, category FROM game_categories_poki
+            WHERE game_id IN ({','.join('?' * len(games))})
+            ORDER BY game_id, category
+        '''
+        categories = {}
+        for row in execute_query(categories_query, tuple(game['id'] for game in games)):
+            categories.setdefault(row['game_id'], []).append(row['category'])
+        for game in games:
+            game['categories'] = categories.get(game['id'], [])
+
+    @staticmethod
+    def get_page(platform: str, limit: int, after: Optional[tuple] = None) -> Tuple[List[Dict[str, Any]], Optional[tuple]]:
+        """
+        按 (positive_ratio DESC, id) 的顺序获取 after 之后的一页游戏（游标分页）
+
+        排序和 get_all 相同，positive_ratio 为空的游戏排在最后；每一段都是 idx_games_poki_ratio 上的范围查询，
+        直接定位到游标的位置，不需要像 OFFSET 一样扫描前面的所有行
+
+        Args:
+            platform: 平台名称
+            limit: 每页数量
+            after: 上一页最后一个游戏的 (positive_ratio, id)，None表示第一页
+
+        Returns:
+            (游戏列表, 最后一个游戏的 (positive_ratio, id))，没有更多游戏时第二项为None
+        """
+        if platform != 'poki':
+            return [], None
+
+        expr = _rating_sql()['ratio']
+        columns = f'id, title, description, up_count, down_count, url, fetch_time, {expr} AS positive_ratio'
+        ratio, game_id = after if after else (None, None)
+        segments = []
+        if after is None:
+            segments.append((f'{expr} IS NOT NULL', ()))
+        elif ratio is not None:
+            segments.append((f'{expr} = ? AND id > ?', (ratio, game_id)))
+            segments.append((f'{expr} < ?', (ratio,)))
+        if after is None or ratio is not None:
+            segments.append((f'{expr} IS NULL', ()))
+        else:
+            segments.append((f'{expr} IS NULL AND id > ?', (game_id,)))
+
+        # 多取一行判断是否还有下一页
+        games = []
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            for condition, params in segments:
+                cursor.execute(f'''
+                    SELECT {columns} FROM games_poki
+                    WHERE {condition}
+                    ORDER BY {expr} DESC, id
+                    LIMIT ?
+                ''', params + (limit + 1 - len(games),))
+                games.extend(fetch_dicts(cursor, cursor.fetchall()))
+                if len(games) > limit:
+                    break
+
+        last = (games[limit - 1]['positive_ratio'], games[limit - 1]['id']) if len(games) > limit else None
+        games = games[:limit]
+        for game in games:
+            del game['positive_ratio']
+        Game._attach_categories(games)
+        return games, last
+
     @staticmethod
     def get_by_id(game_id: str) -> Optional[Dict[str, Any]]:
         """根据ID获取游戏详情"""
@@ -39,32 +112,53 @@ class Game:
             FROM games_poki g
             WHERE g.id = ?
         '''
-        game = execute_query_one(query, (game_id,))
         
-        if game:
-            # 获取游戏的分类
-            categories_query = '''
-                SELECT category FROM game_categories_poki WHERE game_id = ?
-            '''
-            categories = execute_query(categories_query, (game_id,))
-            game['categories'] = [cat['category'] for cat in categories]
-            
-            # 获取相关分类
-            related_query = '''
-                SELECT category FROM related_categories_poki WHERE game_id = ?
+        # 获取游戏的分类和相关分类（一个查询）
+        categories_query = '''
+            SELECT 'categories' AS kind, category FROM game_categories_poki WHERE game_id = ?
+            UNION ALL
+            SELECT 'related_categories' AS kind, category FROM related_categories_poki WHERE game_id = ?
+            ORDER BY kind, category
+        '''
+        
+        # 获取评分历史：每行代表一段评分不变的区间，
+        # 区间结束时间（confirmed_time）也作为一个数据点返回；
+        # 抓取程序还没有迁移数据库时没有该列，只返回区间开始时间
+        if schema_version(CONFIRMED_TIME_VERSION) >= CONFIRMED_TIME_VERSION:
+            history_query = '''
+                SELECT up_count, down_count, fetch_time
+                FROM games_rating_poki
+                WHERE game_id = ?
+                UNION ALL
+                SELECT up_count, down_count, confirmed_time
+                FROM games_rating_poki
+                WHERE game_id = ? AND confirmed_time > fetch_time
+                ORDER BY fetch_time ASC
             '''
-            related = execute_query(related_query, (game_id,))
-            game['related_categories'] = [cat['category'] for cat in related]
-            
-            # 获取评分历史
+            history_params = (game_id, game_id)
+        else:
             history_query = '''
                 SELECT up_count, down_count, fetch_time
                 FROM games_rating_poki
                 WHERE game_id = ?
                 ORDER BY fetch_time ASC
             '''
-            rating_history = execute_query(history_query, (game_id,))
-            game['rating_history'] = rating_history
+            history_params = (game_id,)
+        
+        # 所有查询共用一个连接
+        games, categories, rating_history = execute_queries([
+            (query, (game_id,)),
+            (categories_query, (game_id, game_id)),
+            (history_query, history_params),
+        ])
+        
+        if not games:
+            return None
+        
+        game = games[0]
+        game['categories'] = [row['category'] for row in categories if row['kind'] == 'categories']
+        game['related_categories'] = [row['category'] for row in categories if row['kind'] == 'related_categories']
+        game['rating_history'] = rating_history
         
         return game
 
@@ -90,16 +184,17 @@ class Ranking:
     def get_top(platform: str, limit: int) -> List[Dict[str, Any]]:
         """获取游戏排行榜"""
         if platform == 'poki':
-            query = '''
+            rating = _rating_sql()
+            query = f'''
                 SELECT 
                     g.id, 
                     g.title, 
                     g.url,
                     g.up_count, 
                     g.down_count,
-                    (g.up_count * 1.0 / (g.up_count + g.down_count + 1)) AS positive_ratio
+                    {rating['ratio']} AS positive_ratio
                 FROM games_poki g
-                WHERE g.up_count + g.down_count > 10  -- 至少有10个评分
+                WHERE {rating['votes']} > 10  -- 至少有10个评分
                 ORDER BY positive_ratio DESC, g.up_count DESC
                 LIMIT ?
             '''
@@ -161,7 +256,7 @@ class Statistics:
                     date(fetch_time) as date, 
                     COUNT(*) as count
                 FROM games_poki
-                WHERE date(fetch_time) >= ?
+                WHERE fetch_time >= ?
                 GROUP BY date(fetch_time)
                 ORDER BY date(fetch_time)
             '''
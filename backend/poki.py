@@ -1,15 +1,76 @@
-from bs4 import BeautifulSoup
-import requests
-import json
-import re
+import argparse
+import functools
+import heapq
+import multiprocessing
+import os
+import queue
+import random
+import socket
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from lib import find_latest_sitemap, SITEMAP_PATH, get_game_urls
+from lib import find_latest_sitemap, SITEMAP_PATH, get_game_urls, HostRateLimiter, HttpClient, ValidatorCache
+from lib import extract_initial_state, extract_initial_state_soup, Metrics, get_version, migrate
 import time
 import threading
 
 # 数据库文件路径
 DB_PATH = './data/games.db'
+# 游戏页面的 ETag / Last-Modified 缓存
+HTTP_CACHE_PATH = './data/http_cache/poki.json'
+# 抓取指标输出目录，每个进程一个JSON文件
+METRICS_PATH = './data/metrics'
+METRICS_INTERVAL = int(os.getenv('METRICS_INTERVAL', 30))
+
+# 并发抓取配置：同时进行中的请求数，以及每个域名的请求速率（次/秒）和突发上限
+CRAWL_WORKERS = int(os.getenv('CRAWL_WORKERS', 8))
+HOST_RATE = float(os.getenv('CRAWL_HOST_RATE', 2))
+HOST_BURST = int(os.getenv('CRAWL_HOST_BURST', 4))
+REQUEST_TIMEOUT = 30
+
+# 抓取失败后的重试：指数退避的初始间隔和上限（秒），超过最大次数后不再重试
+FRONTIER_BASE_DELAY = int(os.getenv('FRONTIER_BASE_DELAY', 30))
+FRONTIER_MAX_DELAY = int(os.getenv('FRONTIER_MAX_DELAY', 6 * 3600))
+FRONTIER_MAX_ATTEMPTS = int(os.getenv('FRONTIER_MAX_ATTEMPTS', 10))
+FRONTIER_POLL_INTERVAL = 60
+
+# 抓取进程每次领取的URL数量和租约时长（秒），租约应长于处理一批URL所需的时间
+LEASE_BATCH_SIZE = int(os.getenv('LEASE_BATCH_SIZE', 100))
+LEASE_SECONDS = int(os.getenv('LEASE_SECONDS', 600))
+
+# 评分刷新调度：同时刷新的游戏数，刷新间隔上下限（秒），
+# 以及平均每攒够多少票刷新一次、多久重新加载游戏列表和报告一次进度
+RATING_WORKERS = int(os.getenv('RATING_WORKERS', 4))
+RATING_MIN_INTERVAL = int(os.getenv('RATING_MIN_INTERVAL', 15 * 60))
+RATING_MAX_INTERVAL = int(os.getenv('RATING_MAX_INTERVAL', 24 * 3600))
+RATING_TARGET_VOTES = int(os.getenv('RATING_TARGET_VOTES', 20))
+RATING_RELOAD_INTERVAL = 600
+RATING_REPORT_INTERVAL = 300
+
+# 批量写入配置：每个事务最多写入的记录数，以及一个批次最长等待的毫秒数
+WRITE_BATCH_SIZE = int(os.getenv('WRITE_BATCH_SIZE', 200))
+WRITE_FLUSH_MS = int(os.getenv('WRITE_FLUSH_MS', 500))
+
+# 初始抓取和评分线程共用同一份域名限速预算和连接池，连接数不小于两者同时进行中的请求数
+rate_limiter = HostRateLimiter(HOST_RATE, HOST_BURST)
+http_client = HttpClient(
+    pool_size=CRAWL_WORKERS + RATING_WORKERS,
+    validators=ValidatorCache(HTTP_CACHE_PATH),
+    timeout=REQUEST_TIMEOUT,
+)
+
+def resize_http_client(pool_size):
+    """
+    按本进程实际的并发请求数（--threads）重新创建连接池，条件请求的校验信息保持不变
+    """
+    global http_client
+    http_client = HttpClient(pool_size=pool_size, validators=http_client.validators, timeout=REQUEST_TIMEOUT)
+
+# 抓取、解析、写库各阶段的耗时和计数
+metrics = Metrics(ratios={
+    'error_rate': (['fetch_errors', 'parse_errors'], ['pages', 'fetch_errors']),
+    'not_modified_rate': (['not_modified'], ['pages', 'not_modified']),
+})
 
 def get_db_connection():
     """
@@ -60,7 +121,8 @@ def create_database():
     )
     ''')
     
-    # 创建游戏评分历史表
+    # 创建游戏评分历史表，只在评分变化时新增一行，
+    # confirmed_time 记录最后一次确认评分未变化的时间
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS games_rating_poki (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -68,176 +130,539 @@ def create_database():
         up_count INTEGER,
         down_count INTEGER,
         fetch_time TIMESTAMP,
+        confirmed_time TIMESTAMP,
         FOREIGN KEY (game_id) REFERENCES games_poki(id)
     )
     ''')
     
+    # 创建抓取队列表，记录每个URL的抓取状态（pending / done / failed）、
+    # 失败次数和下次允许抓取的时间，重启后从这里继续；
+    # lease_owner / lease_expires 是抓取进程领取URL的租约，过期后其他进程可以重新领取
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS crawl_frontier_poki (
+        url TEXT PRIMARY KEY,
+        state TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_time REAL NOT NULL DEFAULT 0,
+        last_error TEXT,
+        updated_time TIMESTAMP,
+        lease_owner TEXT,
+        lease_expires REAL
+    )
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_crawl_frontier_poki_due
+    ON crawl_frontier_poki (state, next_attempt_time)
+    ''')
+    
     conn.commit()
+    
+    # 旧数据库补充新增的列，并添加索引等（按 user_version 只执行未执行过的迁移）
+    migrate(conn)
     return conn
 
-def save_game_to_db(conn, game_data):
+def write_records(cursor, games, ratings, failures=()):
     """
-    将游戏数据保存到数据库
+    在当前事务中批量写入游戏数据、评分历史和抓取失败记录
+    
+    Args:
+        cursor: 数据库游标
+        games: 游戏数据字典列表
+        ratings: (game_id, up_count, down_count) 元组列表
+        failures: (url, 错误信息) 元组列表
     """
-    try:
-        cursor = conn.cursor()
-        
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    if games:
         # 插入游戏基本信息
-        cursor.execute('''
+        cursor.executemany('''
         INSERT OR REPLACE INTO games_poki (id, url, slug, title, description, up_count, down_count, fetch_time)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            game_data['id'],
-            game_data['url'],
-            game_data['slug'],
-            game_data['title'],
-            game_data['description'],
-            game_data['up_count'],
-            game_data['down_count'],
-            datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        ))
-        
+        ''', [(
+            game['id'],
+            game['url'],
+            game['slug'],
+            game['title'],
+            game['description'],
+            game['up_count'],
+            game['down_count'],
+            now
+        ) for game in games])
+
+        game_ids = [(game['id'],) for game in games]
+
         # 插入游戏分类前，删除旧的分类关系
-        cursor.execute('DELETE FROM game_categories_poki WHERE game_id = ?', (game_data['id'],))
-        # 插入新的分类关系
-        for category in game_data['categories']:
-            cursor.execute('''
-            INSERT INTO game_categories_poki (game_id, category)
-            VALUES (?, ?)
-            ''', (game_data['id'], category))
-        
+        cursor.executemany('DELETE FROM game_categories_poki WHERE game_id = ?', game_ids)
+        cursor.executemany('''
+        INSERT INTO game_categories_poki (game_id, category)
+        VALUES (?, ?)
+        ''', [(game['id'], category) for game in games for category in game['categories']])
+
         # 插入相关分类前，删除旧的相关分类
-        cursor.execute('DELETE FROM related_categories_poki WHERE game_id = ?', (game_data['id'],))
-        # 插入新的相关分类
-        for category in game_data['relatedCategories']:
-            cursor.execute('''
-            INSERT INTO related_categories_poki (game_id, category)
-            VALUES (?, ?)
-            ''', (game_data['id'], category))
-        
+        cursor.executemany('DELETE FROM related_categories_poki WHERE game_id = ?', game_ids)
+        cursor.executemany('''
+        INSERT INTO related_categories_poki (game_id, category)
+        VALUES (?, ?)
+        ''', [(game['id'], category) for game in games for category in game['relatedCategories']])
+
         # 同时记录评分历史
-        save_rating_history(conn, game_data['id'], game_data['up_count'], game_data['down_count'])
-        
+        ratings = [(game['id'], game['up_count'], game['down_count']) for game in games] + list(ratings)
+
+        # 抓取队列中标记为已完成
+        cursor.executemany('''
+        INSERT INTO crawl_frontier_poki (url, state, updated_time) VALUES (?, 'done', ?)
+        ON CONFLICT(url) DO UPDATE SET
+            state = 'done',
+            last_error = NULL,
+            updated_time = excluded.updated_time,
+            lease_owner = NULL,
+            lease_expires = NULL
+        ''', [(game['url'], now) for game in games])
+
+    if ratings:
+        write_rating_changes(cursor, ratings, now)
+
+    if failures:
+        write_frontier_failures(cursor, failures, now)
+
+def get_latest_ratings(cursor, game_ids):
+    """
+    获取每个游戏最新的一条评分历史
+    
+    Returns:
+        {game_id: (id, up_count, down_count)}
+    """
+    latest = {}
+    game_ids = list(game_ids)
+    # SQLite 对参数个数有限制，分段查询
+    for i in range(0, len(game_ids), 500):
+        chunk = game_ids[i:i + 500]
+        placeholders = ','.join('?' * len(chunk))
+        cursor.execute(f'''
+        SELECT id, game_id, up_count, down_count FROM games_rating_poki
+        WHERE id IN (
+            SELECT MAX(id) FROM games_rating_poki WHERE game_id IN ({placeholders}) GROUP BY game_id
+        )
+        ''', chunk)
+        for row_id, game_id, up_count, down_count in cursor.fetchall():
+            latest[game_id] = (row_id, up_count, down_count)
+    return latest
+
+def write_rating_changes(cursor, ratings, now):
+    """
+    写入评分历史：评分有变化时新增一行，未变化时只更新最新一行的 confirmed_time
+    """
+    # 同一批次中同一个游戏只保留最后一次结果
+    current = {game_id: (up_count, down_count) for game_id, up_count, down_count in ratings}
+    latest = get_latest_ratings(cursor, current.keys())
+
+    changed, confirmed = [], []
+    for game_id, (up_count, down_count) in current.items():
+        previous = latest.get(game_id)
+        if previous and previous[1:] == (up_count, down_count):
+            confirmed.append((now, previous[0]))
+        else:
+            changed.append((game_id, up_count, down_count, now, now))
+
+    if changed:
+        cursor.executemany('''
+        INSERT INTO games_rating_poki (game_id, up_count, down_count, fetch_time, confirmed_time)
+        VALUES (?, ?, ?, ?, ?)
+        ''', changed)
+    if confirmed:
+        cursor.executemany('UPDATE games_rating_poki SET confirmed_time = ? WHERE id = ?', confirmed)
+
+def backoff_delay(attempts):
+    """
+    第attempts次失败后的等待时间：指数退避，取区间后半段的随机值避免集中重试
+    """
+    delay = min(FRONTIER_MAX_DELAY, FRONTIER_BASE_DELAY * 2 ** (attempts - 1))
+    return random.uniform(delay / 2, delay)
+
+def write_frontier_failures(cursor, failures, now):
+    """
+    记录抓取失败：累加失败次数并按指数退避推迟下次抓取，超过最大次数后标记为failed
+    """
+    failures = dict(failures)
+    urls = list(failures)
+    attempts = {}
+    for i in range(0, len(urls), 500):
+        chunk = urls[i:i + 500]
+        placeholders = ','.join('?' * len(chunk))
+        cursor.execute(f'SELECT url, attempts FROM crawl_frontier_poki WHERE url IN ({placeholders})', chunk)
+        attempts.update(cursor.fetchall())
+
+    rows = []
+    for url, error in failures.items():
+        count = attempts.get(url, 0) + 1
+        state = 'failed' if count >= FRONTIER_MAX_ATTEMPTS else 'pending'
+        rows.append((url, state, count, time.time() + backoff_delay(count), error, now))
+    cursor.executemany('''
+    INSERT INTO crawl_frontier_poki (url, state, attempts, next_attempt_time, last_error, updated_time)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(url) DO UPDATE SET
+        state = excluded.state,
+        attempts = excluded.attempts,
+        next_attempt_time = excluded.next_attempt_time,
+        last_error = excluded.last_error,
+        updated_time = excluded.updated_time,
+        lease_owner = NULL,
+        lease_expires = NULL
+    ''', rows)
+
+def seed_frontier(conn, urls, known_urls):
+    """
+    把sitemap中的URL加入抓取队列：已入库的标记为done，其余为pending，已存在的URL保持原状态
+    """
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        conn.executemany('''
+        INSERT OR IGNORE INTO crawl_frontier_poki (url, state, updated_time) VALUES (?, ?, ?)
+        ''', [(url, 'done' if url in known_urls else 'pending', now) for url in urls])
         conn.commit()
-        print(f"成功保存游戏 '{game_data['title']}' 到数据库")
-    except sqlite3.Error as e:
-        print(f"保存游戏数据时发生数据库错误: {e}")
-        # 避免部分提交
+    except sqlite3.Error:
         conn.rollback()
         raise
 
-def save_rating_history(conn, game_id, up_count, down_count):
+def worker_id():
+    """
+    当前抓取进程的标识，用作租约持有者
     """
-    保存游戏评分历史
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def claim_urls(conn, owner, limit=LEASE_BATCH_SIZE, lease_seconds=LEASE_SECONDS):
+    """
+    领取一批可以抓取的URL（pending、已过退避时间、没有租约或租约已过期），
+    在同一个写事务中加上租约，多个进程同时领取时不会拿到相同的URL
+    
+    Returns:
+        领取到的URL列表
     """
+    now = time.time()
+    expires = now + lease_seconds
+    cursor = conn.cursor()
     try:
-        cursor = conn.cursor()
-        
-        # 插入评分历史
+        cursor.execute('BEGIN IMMEDIATE')
         cursor.execute('''
-        INSERT INTO games_rating_poki (game_id, up_count, down_count, fetch_time)
-        VALUES (?, ?, ?, ?)
-        ''', (
-            game_id,
-            up_count,
-            down_count,
-            datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        ))
-        
-        print(f"成功记录游戏 ID:{game_id} 的评分历史：👍 {up_count} / 👎 {down_count}")
-    except sqlite3.Error as e:
-        print(f"保存评分历史时发生数据库错误: {e}")
-        # 不抛出异常，继续处理其他数据
+        UPDATE crawl_frontier_poki SET lease_owner = ?, lease_expires = ?
+        WHERE url IN (
+            SELECT url FROM crawl_frontier_poki
+            WHERE state = 'pending' AND next_attempt_time <= ?
+              AND (lease_expires IS NULL OR lease_expires < ?)
+            ORDER BY attempts, next_attempt_time
+            LIMIT ?
+        )
+        ''', (owner, expires, now, now, limit))
+        cursor.execute('''
+        SELECT url FROM crawl_frontier_poki WHERE lease_owner = ? AND lease_expires = ?
+        ''', (owner, expires))
+        urls = [url for (url,) in cursor.fetchall()]
+        conn.commit()
+        return urls
+    except sqlite3.Error:
+        conn.rollback()
+        raise
 
-def fetch_game_data(url):
+def count_active_leases(conn, owner):
     """
-    专门从页面的script标签中提取投票数据，
-    查找window.INITIAL_STATE中的数据
+    统计其他进程持有且尚未过期的租约数
     """
-    res = requests.get(url)
-    res.raise_for_status()
-    
-    soup = BeautifulSoup(res.text, 'html.parser')
-    scripts = soup.find_all('script')
+    cursor = conn.cursor()
+    cursor.execute('''
+    SELECT COUNT(*) FROM crawl_frontier_poki
+    WHERE state = 'pending' AND lease_expires >= ? AND lease_owner != ?
+    ''', (time.time(), owner))
+    return cursor.fetchone()[0]
+
+def compact_rating_history(conn):
+    """
+    一次性压缩评分历史：把同一游戏连续多行相同评分合并为第一行，
+    并把合并后最后一行的时间记为 confirmed_time
     
-    for script in scripts:
-        script_content = script.string
-        if not script_content:
+    Returns:
+        删除的行数
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+    SELECT id, game_id, up_count, down_count, fetch_time, confirmed_time
+    FROM games_rating_poki
+    ORDER BY game_id, fetch_time, id
+    ''')
+
+    # 先读完所有行再写入：查询可能正在扫描 idx_games_rating_poki_game_time，
+    # 在扫描过程中删除行或更新 confirmed_time（索引列）的结果是未定义的
+    updates, deletes = [], []
+    run = None  # [保留行id, game_id, up_count, down_count, 原confirmed_time, 最后确认时间]
+    for row_id, game_id, up_count, down_count, fetch_time, confirmed_time in cursor:
+        last_time = max(fetch_time, confirmed_time or fetch_time)
+        if run and run[1:4] == [game_id, up_count, down_count]:
+            deletes.append((row_id,))
+            run[5] = max(run[5], last_time)
             continue
-        
-        # 查找window.INITIAL_STATE对象
-        if 'window.INITIAL_STATE' in script_content:
-            # 提取INITIAL_STATE对象的内容
-            try:
-                # 使用正则表达式提取window.INITIAL_STATE = {...} 之间的JSON内容
-                pattern = r'window\.INITIAL_STATE\s*=\s*\{[\s\S]*'#?\s*<\/script>'
-                matches = re.search(pattern, script_content, re.DOTALL)
-                if matches is None:
-                    print("未找到window.INITIAL_STATE")
-                    return {}
-
-                json_str = matches.group(0)[len("window.INITIAL_STATE = "):-4]
-
-                state_data = json.loads(json_str)
-                api_key = None
-                for key in state_data["api"]['queries'].keys():
-                    if key.startswith("getGame"):
-                        api_key = key
-                        break
-                if api_key is None:
-                    print("未找到getGame")
-                    return {}
-                body = state_data["api"]['queries'][api_key]['data']
-                data = {
-                    "id": body['id'],
-                    "url": url,
-                    "slug": body['slug'],
-                    "title": body['title'],
-                    "description": body['description'],
-                    "categories": list(map(lambda x: x['title'], body['categories'])),
-                    "up_count": body['rating']['up_count'],
-                    "down_count": body['rating']['down_count'],
-                    "relatedCategories": list(map(lambda x: x['title'], body['relatedCategories']))
-                }
+        if run and run[5] != run[4]:
+            updates.append((run[5], run[0]))
+        run = [row_id, game_id, up_count, down_count, confirmed_time, last_time]
+    if run and run[5] != run[4]:
+        updates.append((run[5], run[0]))
 
-                return data
-                
-            except Exception as e:
-                print(f"提取INITIAL_STATE时出错: {e}")
-    
-    print("未找到window.INITIAL_STATE数据")
-    return {}
+    try:
+        cursor.executemany('UPDATE games_rating_poki SET confirmed_time = ? WHERE id = ?', updates)
+        cursor.executemany('DELETE FROM games_rating_poki WHERE id = ?', deletes)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
 
-def process_game_url(url, db_conn):
-    """
-    处理单个游戏URL：抓取数据并保存到数据库
+    deleted_count = len(deletes)
+    print(f"评分历史压缩完成，删除 {deleted_count} 行重复记录（可执行 VACUUM 回收磁盘空间）")
+    return deleted_count
+
+class GameWriter(threading.Thread):
     """
-    # print(f"处理游戏URL: {url}")
-    game_data = fetch_game_data(url)
+    唯一的数据库写线程：抓取循环和评分线程把记录放入队列，
+    写线程每攒够 batch_size 条或等待 flush_interval 秒后，在一个事务中批量写入
     
-    if game_data:
+    Args:
+        batch_size: 每个事务最多写入的记录数
+        flush_interval: 一个批次最长等待时间（秒）
+        known_urls: 已入库的游戏URL集合，提交成功后写线程会把新游戏的URL加入其中
+    """
+
+    _STOP = object()
+
+    def __init__(self, batch_size=WRITE_BATCH_SIZE, flush_interval=WRITE_FLUSH_MS / 1000, known_urls=None):
+        super().__init__(name='game-writer', daemon=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.known_urls = known_urls if known_urls is not None else set()
+        self.queue = queue.Queue(maxsize=batch_size * 4)
+        # 写线程退出的原因（关闭或意外退出），之后提交记录时抛出，避免提交方在已满的队列上一直阻塞
+        self.error = None
+
+    def _check_alive(self):
+        if self.error is not None:
+            raise RuntimeError(f"写线程已退出: {self.error}") from self.error
+
+    def _drain(self):
+        # 写线程退出后丢弃队列中剩余的记录，flush() 不会一直等待
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+            self.queue.task_done()
+
+    def _put(self, record):
+        while True:
+            self._check_alive()
+            try:
+                self.queue.put(record, timeout=1)
+            except queue.Full:
+                continue
+            if self.error is not None:
+                self._drain()
+                self._check_alive()
+            return
+
+    def submit_game(self, game_data, on_error=None, on_success=None):
+        """
+        提交游戏数据，写入失败时在写线程中调用 on_error(game_data, exception)，提交成功后调用 on_success()
+        """
+        self._put(('game', game_data, on_error, on_success))
+
+    def submit_rating(self, game_id, up_count, down_count, on_error=None, on_success=None):
+        """
+        提交评分历史
+        """
+        self._put(('rating', (game_id, up_count, down_count), on_error, on_success))
+
+    def submit_failure(self, url, error):
+        """
+        提交抓取失败记录，由写线程更新抓取队列中的重试时间
+        """
+        self._put(('failure', (url, error), None, None))
+
+    def flush(self):
+        """
+        阻塞直到队列中已提交的记录全部写入（或失败），写线程已退出时抛出 RuntimeError
+        """
+        self.queue.join()
+        self._check_alive()
+
+    def close(self):
+        if self.is_alive():
+            try:
+                self._put((self._STOP, None, None, None))
+            except RuntimeError:
+                pass
+            self.join()
+
+    def run(self):
+        try:
+            self._run()
+        except BaseException as e:
+            print(f"写线程意外退出: {e}")
+            self.error = e
+        else:
+            self.error = RuntimeError("已关闭")
+        self._drain()
+
+    def _run(self):
+        conn = get_db_connection()
         try:
-            save_game_to_db(db_conn, game_data)
-            return True
+            stopping = False
+            while not stopping:
+                batch = [self.queue.get()]
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self.queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+
+                records = [record for record in batch if record[0] is not self._STOP]
+                stopping = len(records) < len(batch)
+                try:
+                    if records:
+                        self._write_batch(conn, records)
+                except Exception as e:
+                    # 单个批次出错不能让写线程退出
+                    print(f"写入批次时出错: {e}")
+                finally:
+                    for _ in batch:
+                        self.queue.task_done()
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn, records):
+        try:
+            self._write(conn, records)
+            print(f"批量写入 {len(records)} 条记录")
+            self._notify_success(records)
         except Exception as e:
-            print(f"保存游戏数据到数据库时出错: {e}")
-            return False
-    else:
-        print(f"无法从 {url} 抓取游戏数据")
-        return False
+            print(f"批量写入时出错: {e}，逐条重试")
+            # 逐条写入，找出有问题的记录
+            for record in records:
+                try:
+                    self._write(conn, [record])
+                    self._notify_success([record])
+                except Exception as record_error:
+                    print(f"写入记录时出错: {record_error}")
+                    kind, payload, on_error, _ = record
+                    if kind == 'game' and isinstance(payload, dict) and 'url' in payload:
+                        self._record_failure(conn, payload['url'], f"写入失败: {record_error}")
+                    if on_error:
+                        try:
+                            on_error(payload, record_error)
+                        except Exception as e:
+                            print(f"写入失败回调出错: {e}")
+
+    def _notify_success(self, records):
+        # 回调出错不影响已提交的数据，也不能让写线程退出
+        for _, _, _, on_success in records:
+            if on_success:
+                try:
+                    on_success()
+                except Exception as e:
+                    print(f"写入成功回调出错: {e}")
 
-def is_url_in_db(url, db_conn):
+    def _record_failure(self, conn, url, error):
+        try:
+            self._write(conn, [('failure', (url, error), None, None)])
+        except Exception as e:
+            print(f"记录抓取失败时发生数据库错误: {e}")
+
+    def _write(self, conn, records):
+        games = [payload for kind, payload, _, _ in records if kind == 'game']
+        ratings = [payload for kind, payload, _, _ in records if kind == 'rating']
+        failures = [payload for kind, payload, _, _ in records if kind == 'failure']
+        try:
+            with metrics.timer('persist'):
+                write_records(conn.cursor(), games, ratings, failures)
+                conn.commit()
+        except Exception:
+            # 避免部分提交
+            conn.rollback()
+            metrics.incr('persist_errors')
+            raise
+        metrics.incr('records_written', len(records))
+        self.known_urls.update(game['url'] for game in games)
+
+def parse_game_state(state_data, url):
     """
-    检查URL是否在数据库中
+    从INITIAL_STATE中取出getGame查询的游戏数据
     """
     try:
-        cursor = db_conn.cursor()
-        cursor.execute('SELECT COUNT(*) FROM games_poki WHERE url = ?', (url,))
-        result = cursor.fetchone()
-        return result[0] > 0
-    except sqlite3.Error as e:
-        print(f"查询数据库时出错: {e}")
-        return False  # 查询失败时默认返回false，允许再次尝试
+        api_key = None
+        for key in state_data["api"]['queries'].keys():
+            if key.startswith("getGame"):
+                api_key = key
+                break
+        if api_key is None:
+            print("未找到getGame")
+            return {}
+        body = state_data["api"]['queries'][api_key]['data']
+        return {
+            "id": body['id'],
+            "url": url,
+            "slug": body['slug'],
+            "title": body['title'],
+            "description": body['description'],
+            "categories": list(map(lambda x: x['title'], body['categories'])),
+            "up_count": body['rating']['up_count'],
+            "down_count": body['rating']['down_count'],
+            "relatedCategories": list(map(lambda x: x['title'], body['relatedCategories']))
+        }
+    except Exception as e:
+        print(f"提取INITIAL_STATE时出错: {e}")
+        return {}
+
+def fetch_game_data(url, conditional=False):
+    """
+    专门从页面的script标签中提取投票数据，
+    查找window.INITIAL_STATE中的数据
+    
+    conditional为True时发送条件请求，页面未变化（304）则返回None，不做解析
+
+    Returns:
+        (游戏数据, 响应对象)；页面未变化时返回 (None, None)
+        数据写入成功后再调用 http_client.remember(url, 响应对象) 保存校验信息
+    """
+    metrics.observe('throttle', rate_limiter.acquire(url))
+    try:
+        with metrics.timer('fetch'):
+            res = http_client.get(url, conditional=conditional)
+    except Exception:
+        metrics.incr('fetch_errors')
+        raise
+    if res is None:
+        metrics.incr('not_modified')
+        return None, None
+    metrics.incr('pages')
+    
+    with metrics.timer('parse'):
+        # 先按字节定位INITIAL_STATE，失败时再用BeautifulSoup完整解析
+        state_data = extract_initial_state(res.content)
+        if state_data is None:
+            state_data = extract_initial_state_soup(res.text)
+        game_data = parse_game_state(state_data, url) if state_data is not None else {}
+    
+    if state_data is None:
+        print("未找到window.INITIAL_STATE数据")
+    if not game_data:
+        metrics.incr('parse_errors')
+    return game_data, res
+
+def load_known_urls(db_conn):
+    """
+    一次性加载数据库中已有的所有游戏URL
+    """
+    cursor = db_conn.cursor()
+    cursor.execute('SELECT url FROM games_poki')
+    return {url for (url,) in cursor}
 
 def get_all_game_ids(db_conn):
     """
@@ -247,149 +672,380 @@ def get_all_game_ids(db_conn):
     cursor.execute('SELECT id, url FROM games_poki')
     return cursor.fetchall()
 
-def fetch_ratings_hourly():
+def parse_db_time(value):
+    return datetime.strptime(value, '%Y-%m-%d %H:%M:%S').timestamp()
+
+class RatingScheduler:
     """
-    每小时抓取一次所有游戏的评分数据
+    评分刷新调度器：按每个游戏最近的投票速度决定刷新间隔，
+    热门游戏频繁刷新，长期没有新投票的游戏每天刷新一次
+    
+    所有游戏按下次到期时间放在优先队列中，到期后交给线程池抓取；
+    观测不足、还不知道投票速度的游戏（新抓取的游戏或刚部署时）按最短间隔刷新，
+    攒够两次观测后再按平滑后的速度调度
+    
+    Args:
+        writer: GameWriter 实例
+        workers: 同时刷新的游戏数
     """
-    while True:
-        conn = None
-        try:
-            print(f"开始定时抓取评分数据 - {datetime.now()}")
-            # 每次抓取创建新的数据库连接
-            conn = get_db_connection()
-            
-            # 获取所有游戏ID和URL
-            games = get_all_game_ids(conn)
-            
-            if not games:
-                print("数据库中没有游戏数据")
-                if conn:
-                    conn.close()
-                time.sleep(3600)  # 休眠1小时
-                continue
-                
-            success_count = 0
-            for game_id, url in games:
-                try:
-                    # 抓取游戏数据
-                    game_data = fetch_game_data(url)
-                    
-                    if game_data and 'up_count' in game_data and 'down_count' in game_data:
-                        # 只更新评分历史
-                        save_rating_history(conn, game_id, game_data['up_count'], game_data['down_count'])
-                        conn.commit()  # 每处理一条数据就提交，避免长事务
-                        success_count += 1
-                    
-                    # 避免请求过于频繁
-                    time.sleep(2)
-                except Exception as e:
-                    print(f"抓取游戏 {game_id} 评分数据时出错: {e}")
-                    # 继续处理下一条，不中断整个过程
-            
-            if conn:
-                conn.commit()
-                conn.close()
-                conn = None
-            
-            print(f"评分数据抓取完成，成功更新 {success_count}/{len(games)} 个游戏")
-            
-            # 计算下次抓取时间（下一个整点）
-            now = datetime.now()
-            next_hour = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
-            sleep_seconds = (next_hour - now).total_seconds()
-            
-            print(f"下次抓取时间: {next_hour}，休眠 {sleep_seconds} 秒")
-            time.sleep(sleep_seconds)
+
+    def __init__(self, writer, workers=RATING_WORKERS):
+        self.writer = writer
+        self.workers = workers
+        self._heap = []  # (到期时间, game_id)
+        self._games = {}  # game_id -> {'url', 'votes', 'time', 'velocity'}，velocity 未知时为None
+        self._lock = threading.Lock()
+        self._lags = []
+        self._refreshed = 0
+        self._unchanged = 0
+        self._failed = 0
+
+    @staticmethod
+    def interval_for(velocity):
+        """
+        根据投票速度（票/小时）计算刷新间隔（秒）：预计每攒够 RATING_TARGET_VOTES 票刷新一次，
+        速度未知（None）时尽快刷新以获得第二次观测
+        """
+        if velocity is None:
+            return RATING_MIN_INTERVAL
+        if velocity <= 0:
+            return RATING_MAX_INTERVAL
+        interval = RATING_TARGET_VOTES / velocity * 3600
+        return min(RATING_MAX_INTERVAL, max(RATING_MIN_INTERVAL, interval))
+
+    def load(self, conn):
+        """
+        从数据库加载游戏列表，为尚未调度的游戏估算投票速度和下次到期时间
         
+        Returns:
+            新加入调度的游戏数
+        """
+        cursor = conn.cursor()
+        cursor.execute('''
+        SELECT game_id, MAX(COALESCE(confirmed_time, fetch_time)), MAX(up_count + down_count)
+        FROM games_rating_poki
+        GROUP BY game_id
+        ''')
+        latest = {game_id: (last_time, votes) for game_id, last_time, votes in cursor.fetchall()}
+
+        # 最近7天的投票速度
+        window_start = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S')
+        cursor.execute('''
+        SELECT game_id,
+               MIN(up_count + down_count), MAX(up_count + down_count),
+               MIN(fetch_time), MAX(COALESCE(confirmed_time, fetch_time))
+        FROM games_rating_poki
+        WHERE COALESCE(confirmed_time, fetch_time) >= ?
+        GROUP BY game_id
+        ''', (window_start,))
+        velocities = {}
+        for game_id, min_votes, max_votes, first_time, last_time in cursor.fetchall():
+            hours = (parse_db_time(last_time) - parse_db_time(first_time)) / 3600
+            if hours > 0:
+                velocities[game_id] = (max_votes - min_votes) / hours
+
+        now = time.time()
+        added = 0
+        with self._lock:
+            for game_id, url in get_all_game_ids(conn):
+                if game_id in self._games:
+                    continue
+                last_time, votes = latest.get(game_id, (None, None))
+                velocity = velocities.get(game_id)
+                self._games[game_id] = {
+                    'url': url,
+                    'votes': votes,
+                    'time': parse_db_time(last_time) if last_time else None,
+                    'velocity': velocity,
+                }
+                due = self._games[game_id]['time'] + self.interval_for(velocity) if last_time else now
+                heapq.heappush(self._heap, (due, game_id))
+                added += 1
+        return added
+
+    def lag(self):
+        """
+        当前落后于计划的秒数（最早到期的游戏已经过期多久）
+        """
+        with self._lock:
+            if not self._heap:
+                return 0.0
+            return max(0.0, time.time() - self._heap[0][0])
+
+    def report(self):
+        now = time.time()
+        with self._lock:
+            overdue = sum(1 for due, _ in self._heap if due <= now)
+            lags, self._lags = self._lags, []
+            refreshed, unchanged, failed = self._refreshed, self._unchanged, self._failed
+            self._refreshed = self._unchanged = self._failed = 0
+            total = len(self._games)
+        avg_lag = sum(lags) / len(lags) if lags else 0.0
+        print(f"评分调度: {total} 个游戏，{overdue} 个已到期，当前落后 {self.lag():.0f} 秒，"
+              f"本周期刷新 {refreshed} 个（未变化 {unchanged}，失败 {failed}），平均延迟 {avg_lag:.0f} 秒")
+
+    def _reschedule(self, game_id, votes=None, failed=False):
+        now = time.time()
+        with self._lock:
+            state = self._games[game_id]
+            if failed:
+                self._failed += 1
+                due = now + RATING_MIN_INTERVAL
+            else:
+                if votes is None:
+                    # 页面未变化，视为这段时间没有新投票
+                    self._unchanged += 1
+                    votes = state['votes']
+                if state['time'] is not None and state['votes'] is not None and votes is not None:
+                    hours = (now - state['time']) / 3600
+                    if hours > 0:
+                        current = max(0, votes - state['votes']) / hours
+                        if state['velocity'] is None:
+                            state['velocity'] = current
+                        else:
+                            # 指数平滑，避免单次波动导致间隔剧烈变化
+                            state['velocity'] = 0.5 * state['velocity'] + 0.5 * current
+                state['votes'] = votes
+                state['time'] = now
+                self._refreshed += 1
+                due = now + self.interval_for(state['velocity'])
+            heapq.heappush(self._heap, (due, game_id))
+
+    def _refresh(self, game_id, url):
+        try:
+            game_data, res = fetch_game_data(url, conditional=True)
+            if game_data is None:
+                self._reschedule(game_id)
+            elif 'up_count' in game_data and 'down_count' in game_data:
+                self.writer.submit_rating(game_id, game_data['up_count'], game_data['down_count'],
+                                          on_success=functools.partial(http_client.remember, url, res))
+                self._reschedule(game_id, game_data['up_count'] + game_data['down_count'])
+            else:
+                self._reschedule(game_id, failed=True)
         except Exception as e:
-            print(f"定时抓取评分数据时发生错误: {e}")
-            time.sleep(3600)  # 出错后休眠1小时
-        finally:
-            # 确保连接被关闭
-            if conn:
-                try:
-                    conn.close()
-                except:
-                    pass
+            print(f"抓取游戏 {game_id} 评分数据时出错: {e}")
+            self._reschedule(game_id, failed=True)
 
-def main():
-    """
-    主函数：处理多个游戏URL
-    """
-    try:
-        # 创建数据库连接
-        db_conn = create_database()
+    def run(self):
+        """
+        调度主循环：取出到期的游戏提交给线程池，定期加载新游戏并报告落后情况
+        """
+        slots = threading.Semaphore(self.workers)
+        next_load = next_report = 0.0
 
-        # 启动每小时抓取评分数据的线程
-        rating_thread = threading.Thread(target=fetch_ratings_hourly, daemon=True)
-        rating_thread.start()
-        print("启动评分数据定时抓取线程")
+        def done(_future):
+            slots.release()
 
-        latest_sitemap, _ = find_latest_sitemap('poki', SITEMAP_PATH)
-        print(f"最新sitemap: {latest_sitemap}")
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                now = time.time()
+                if now >= next_load:
+                    conn = get_db_connection()
+                    try:
+                        added = self.load(conn)
+                        if added:
+                            print(f"评分调度新增 {added} 个游戏")
+                    except sqlite3.Error as e:
+                        print(f"加载游戏列表时出错: {e}")
+                    finally:
+                        conn.close()
+                    http_client.validators.save()
+                    next_load = now + RATING_RELOAD_INTERVAL
+                if now >= next_report:
+                    self.report()
+                    next_report = now + RATING_REPORT_INTERVAL
 
-        # 读取sitemap文件
-        game_urls = get_game_urls(latest_sitemap, SITEMAP_PATH)
+                with self._lock:
+                    item = heapq.heappop(self._heap) if self._heap and self._heap[0][0] <= now else None
+                    wait = self._heap[0][0] - now if self._heap else RATING_RELOAD_INTERVAL
+                if item is None:
+                    time.sleep(min(max(wait, 0.1), next_load - now, next_report - now, 60))
+                    continue
 
-        processed_count = 0
-        error_count = 0
-        retry_urls = []
+                due, game_id = item
+                with self._lock:
+                    self._lags.append(max(0.0, now - due))
+                    url = self._games[game_id]['url']
+                slots.acquire()
+                executor.submit(self._refresh, game_id, url).add_done_callback(done)
+
+def refresh_ratings(writer):
+    """
+    评分刷新线程入口
+    """
+    while True:
+        try:
+            RatingScheduler(writer).run()
+        except Exception as e:
+            print(f"评分调度发生错误: {e}")
+            time.sleep(60)
 
-        for url in game_urls:
+def crawl_urls(urls, writer, workers=CRAWL_WORKERS):
+    """
+    并发抓取URL列表：工作线程负责抓取页面，抓取结果和失败记录交给写线程批量写入
+    
+    Args:
+        urls: 待抓取的URL列表
+        writer: GameWriter 实例
+        workers: 同时进行中的请求数
+        
+    Returns:
+        (成功数量, 失败数量)
+    """
+    submitted_count = 0
+    failed_count = 0
+    write_failed_urls = []
+
+    def on_write_error(game_data, error):
+        write_failed_urls.append(game_data['url'])
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(fetch_game_data, url): url for url in urls}
+        for future in as_completed(futures):
+            url = futures[future]
             try:
-                # URL 不在数据库中，才处理
-                if not is_url_in_db(url, db_conn):
-                    success = process_game_url(url, db_conn)
-                    if success:
-                        processed_count += 1
-                    else:
-                        error_count += 1
-                        retry_urls.append(url)
-                    # 每处理10个URL提交一次，避免长事务
-                    if processed_count % 10 == 0:
-                        db_conn.commit()
-                    # 休眠1秒
-                    time.sleep(1)
-            except sqlite3.Error as e:
-                print(f"处理URL {url} 时数据库错误: {e}")
-                # 如果数据库被锁，等待后重试
-                if 'database is locked' in str(e):
-                    print("数据库被锁定，等待5秒后重试...")
-                    time.sleep(5)
-                    retry_urls.append(url)
+                game_data, res = future.result()
+                if game_data:
+                    writer.submit_game(game_data, on_error=on_write_error,
+                                       on_success=functools.partial(http_client.remember, url, res))
+                    submitted_count += 1
                 else:
-                    error_count += 1
-                    retry_urls.append(url)
+                    print(f"无法从 {url} 抓取游戏数据")
+                    writer.submit_failure(url, "未找到游戏数据")
+                    failed_count += 1
             except Exception as e:
                 print(f"处理URL {url} 时未知错误: {e}")
-                error_count += 1
-                retry_urls.append(url)
+                writer.submit_failure(url, str(e))
+                failed_count += 1
 
-        # 处理重试URL
-        if retry_urls:
-            print(f"开始处理 {len(retry_urls)} 个失败的URL...")
-            for url in retry_urls:
-                try:
-                    if not is_url_in_db(url, db_conn):
-                        success = process_game_url(url, db_conn)
-                        if success:
-                            processed_count += 1
-                        time.sleep(2)  # 重试时增加延迟
-                except Exception as e:
-                    print(f"重试处理URL {url} 时错误: {e}")
+    # 等待写线程处理完本轮提交的数据，确保统计完整
+    writer.flush()
+    return submitted_count - len(write_failed_urls), failed_count + len(write_failed_urls)
+
+def crawl_frontier(db_conn, writer, workers=CRAWL_WORKERS, wait_for_leases=False):
+    """
+    按批领取抓取队列中已到期的URL并抓取，直到没有可领取的URL为止
+    
+    Args:
+        wait_for_leases: 没有可领取的URL但其他进程仍持有租约时，是否继续等待
+            （这些租约过期后会被重新领取）
+        
+    Returns:
+        (成功数量, 失败数量)
+    """
+    owner = worker_id()
+    processed_count, error_count = 0, 0
+    while True:
+        due_urls = claim_urls(db_conn, owner)
+        if not due_urls:
+            if wait_for_leases and count_active_leases(db_conn, owner):
+                time.sleep(FRONTIER_POLL_INTERVAL)
+                continue
+            break
+        print(f"[{owner}] 领取URL: {len(due_urls)}，并发数: {workers}")
+        processed, failed = crawl_urls(due_urls, writer, workers)
+        processed_count += processed
+        error_count += failed
+    http_client.validators.save()
+    return processed_count, error_count
+
+def seed_from_sitemap(db_conn, known_urls):
+    """
+    读取最新的poki sitemap并加入抓取队列
+    """
+    latest_sitemap, _ = find_latest_sitemap('poki', SITEMAP_PATH)
+    print(f"最新sitemap: {latest_sitemap}")
+
+    # 新URL加入抓取队列，已完成或正在退避的URL保持原状态
+    game_urls = get_game_urls(os.path.join(SITEMAP_PATH, latest_sitemap))
+    seed_frontier(db_conn, game_urls, known_urls)
+
+def run_worker(workers=CRAWL_WORKERS, processes=1):
+    """
+    抓取进程：领取URL、抓取解析，结果交给本进程的写线程批量写入，没有可领取的URL后退出
 
-        # 提交最终修改
-        db_conn.commit()
+    Args:
+        workers: 本进程同时进行中的请求数
+        processes: 同时运行的抓取进程数，每个进程只使用域名限速预算的 1/processes
+    """
+    global rate_limiter
+    # 每个进程有自己的令牌桶，按进程数平分速率和突发上限，所有进程加起来不超过 CRAWL_HOST_RATE
+    rate_limiter = HostRateLimiter(HOST_RATE / processes, max(1, HOST_BURST // processes))
+    # worker模式没有评分线程，连接池只需容纳本进程的抓取请求
+    resize_http_client(workers)
+
+    metrics_file = os.path.join(METRICS_PATH, f"poki_{worker_id().replace(':', '_')}.json")
+    metrics.start_reporter(metrics_file, METRICS_INTERVAL)
+
+    db_conn = get_db_connection()
+    writer = GameWriter()
+    writer.start()
+    try:
+        processed_count, error_count = crawl_frontier(db_conn, writer, workers, wait_for_leases=True)
+        print(f"[{worker_id()}] 处理完成! 成功: {processed_count}, 失败: {error_count}")
+    finally:
+        writer.close()
+        db_conn.close()
+        metrics.write(metrics_file)
+
+def run_workers(processes, workers=CRAWL_WORKERS):
+    """
+    worker模式：把sitemap加入抓取队列后启动多个抓取进程，域名限速预算由这些进程平分
+    """
+    db_conn = create_database()
+    try:
+        seed_from_sitemap(db_conn, load_known_urls(db_conn))
+    finally:
+        db_conn.close()
+
+    procs = [multiprocessing.Process(target=run_worker, args=(workers, processes)) for _ in range(processes)]
+    for proc in procs:
+        proc.start()
+    print(f"启动 {processes} 个抓取进程")
+    for proc in procs:
+        proc.join()
+
+def main(workers=CRAWL_WORKERS):
+    """
+    主函数：并发处理sitemap中的游戏URL
+    """
+    try:
+        # 抓取线程和评分线程同时请求
+        resize_http_client(workers + RATING_WORKERS)
+        metrics.start_reporter(os.path.join(METRICS_PATH, 'poki.json'), METRICS_INTERVAL)
+
+        # 创建数据库连接
+        db_conn = create_database()
+
+        # 已入库的URL集合，写线程提交新游戏后会同步更新
+        known_urls = load_known_urls(db_conn)
+
+        # 启动唯一的写线程，抓取循环和评分线程都通过它写入数据库
+        writer = GameWriter(known_urls=known_urls)
+        writer.start()
+
+        # 启动按投票速度调度的评分刷新线程
+        rating_thread = threading.Thread(target=refresh_ratings, args=(writer,), daemon=True)
+        rating_thread.start()
+        print("启动评分数据刷新线程")
+
+        seed_from_sitemap(db_conn, known_urls)
+
+        processed_count, error_count = crawl_frontier(db_conn, writer, workers)
         print(f"处理完成! 成功: {processed_count}, 失败: {error_count}")
         
-        # 保持主线程运行，让评分抓取线程能继续工作
+        # 保持主线程运行，让评分抓取线程能继续工作，同时定期抓取退避到期的URL
         try:
             while rating_thread.is_alive():
-                time.sleep(60)  # 每分钟检查一次
+                time.sleep(FRONTIER_POLL_INTERVAL)
+                processed_count, error_count = crawl_frontier(db_conn, writer, workers)
+                if processed_count or error_count:
+                    print(f"重试完成! 成功: {processed_count}, 失败: {error_count}")
         except KeyboardInterrupt:
             print("程序被用户中断")
         finally:
-            # 关闭数据库连接
+            # 写完队列中剩余的数据，再关闭数据库连接
+            writer.close()
             db_conn.close()
     except Exception as e:
         print(f"主程序执行出错: {e}")
@@ -400,6 +1056,36 @@ def main():
         except:
             pass
 
-# 如果直接运行脚本，则执行main函数
+# 如果直接运行脚本，则执行对应的命令
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='poki 游戏数据抓取')
+    parser.add_argument('command', nargs='?', default='crawl', choices=['crawl', 'worker', 'compact-ratings', 'migrate'],
+                        help='crawl: 抓取游戏和评分（默认）；worker: 多进程抓取sitemap中的游戏；'
+                             'compact-ratings: 压缩重复的评分历史；migrate: 升级数据库结构')
+    parser.add_argument('--processes', type=int, default=1, help='worker模式的进程数（共享同一份域名限速预算）')
+    parser.add_argument('--threads', type=int, default=CRAWL_WORKERS, help='每个进程同时进行中的请求数')
+    args = parser.parse_args()
+    if args.processes < 1:
+        parser.error('--processes 必须大于0')
+    if args.threads < 1:
+        parser.error('--threads 必须大于0')
+
+    if args.command == 'worker':
+        run_workers(args.processes, args.threads)
+    elif args.command == 'migrate':
+        conn = get_db_connection()
+        before = get_version(conn)
+        conn.close()
+        conn = create_database()
+        try:
+            print(f"数据库版本: {before} -> {get_version(conn)}")
+        finally:
+            conn.close()
+    elif args.command == 'compact-ratings':
+        conn = create_database()
+        try:
+            compact_rating_history(conn)
+        finally:
+            conn.close()
+    else:
+        main(args.threads)
\ No newline at end of file
@@ -1,9 +1,14 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from flask import Blueprint, jsonify, request
+import base64
+import heapq
+import json
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from typing import List, Dict, Any
 
+from backend.cache import response_cache
 from backend.config import PAGINATION, PLATFORMS, TIME_RANGES
 from backend.models import Game, Category, Ranking, Statistics
 from backend.utils import summarize_changelog
@@ -11,7 +16,18 @@ from backend.utils import summarize_changelog
 # 创建蓝图
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+# 查询参数的解析函数（参数不存在时传入None），路由和响应缓存的缓存键使用同一套解析
+def _platform_arg(value):
+    return PLATFORMS[0] if value is None else value
+
+def _days_arg(value):
+    return 30 if value is None else int(value)
+
+def _rankings_limit_arg(value):
+    return min(20 if value is None else int(value), 100)
+
 @api_bp.route('/platforms', methods=['GET'])
+@response_cache.cached()
 def get_platforms():
     """获取所有平台列表"""
     return jsonify(PLATFORMS)
@@ -26,9 +42,30 @@ def get_games():
     if platform not in PLATFORMS:
         return jsonify({"error": f"不支持的平台: {platform}"}), 400
     
+    # 游标分页：带 cursor 参数（第一页为空字符串）时按游标定位，返回 {"games": [...], "next": 游标}
+    if 'cursor' in request.args:
+        if limit <= 0:
+            return jsonify({"error": "limit必须大于0"}), 400
+        after = None
+        if request.args['cursor']:
+            try:
+                after = _decode_game_cursor(request.args['cursor'])
+            except ValueError:
+                return jsonify({"error": "无效的游标"}), 400
+        games, last = Game.get_page(platform, limit, after)
+        return jsonify({"games": games, "next": _encode_cursor(list(last)) if last else None})
+    
     games = Game.get_all(platform, limit, offset)
     return jsonify(games)
 
+def _decode_game_cursor(cursor):
+    """游标内容为上一页最后一个游戏的 [positive_ratio, id]，格式不正确时抛出 ValueError"""
+    try:
+        ratio, game_id = _decode_json_cursor(cursor)
+        return (None if ratio is None else float(ratio)), str(game_id)
+    except TypeError:
+        raise ValueError(cursor)
+
 @api_bp.route('/games/<game_id>', methods=['GET'])
 def get_game_detail(game_id):
     """获取单个游戏详情"""
@@ -40,9 +77,10 @@ def get_game_detail(game_id):
         return jsonify({"error": "游戏不存在"}), 404
 
 @api_bp.route('/categories', methods=['GET'])
+@response_cache.cached({'platform': _platform_arg})
 def get_categories():
     """获取所有游戏分类"""
-    platform = request.args.get('platform', PLATFORMS[0])
+    platform = _platform_arg(request.args.get('platform'))
     
     if platform not in PLATFORMS:
         return jsonify({"error": f"不支持的平台: {platform}"}), 400
@@ -51,10 +89,14 @@ def get_categories():
     return jsonify(categories)
 
 @api_bp.route('/rankings', methods=['GET'])
+@response_cache.cached({'platform': _platform_arg, 'limit': _rankings_limit_arg})
 def get_rankings():
     """获取游戏排行榜"""
-    platform = request.args.get('platform', PLATFORMS[0])
-    limit = min(int(request.args.get('limit', 20)), 100)
+    platform = _platform_arg(request.args.get('platform'))
+    try:
+        limit = _rankings_limit_arg(request.args.get('limit'))
+    except ValueError:
+        return jsonify({"error": "limit必须是整数"}), 400
     
     if platform not in PLATFORMS:
         return jsonify({"error": f"不支持的平台: {platform}"}), 400
@@ -63,10 +105,14 @@ def get_rankings():
     return jsonify(rankings)
 
 @api_bp.route('/stats', methods=['GET'])
+@response_cache.cached({'platform': _platform_arg, 'days': _days_arg})
 def get_stats():
     """获取平台统计数据"""
-    platform = request.args.get('platform', PLATFORMS[0])
-    days = int(request.args.get('days', 30))
+    platform = _platform_arg(request.args.get('platform'))
+    try:
+        days = _days_arg(request.args.get('days'))
+    except ValueError:
+        return jsonify({"error": "天数必须是整数"}), 400
     
     if platform not in PLATFORMS:
         return jsonify({"error": f"不支持的平台: {platform}"}), 400
@@ -78,10 +124,14 @@ def get_stats():
     return jsonify(stats)
 
 @api_bp.route('/games/trend', methods=['GET'])
+@response_cache.cached({'platform': _platform_arg, 'days': _days_arg})
 def get_games_trend():
     """获取游戏增减趋势"""
-    platform = request.args.get('platform', PLATFORMS[0])
-    days = int(request.args.get('days', 30))
+    platform = _platform_arg(request.args.get('platform'))
+    try:
+        days = _days_arg(request.args.get('days'))
+    except ValueError:
+        return jsonify({"error": "天数必须是整数"}), 400
     
     if platform not in PLATFORMS:
         return jsonify({"error": f"不支持的平台: {platform}"}), 400
@@ -116,57 +166,113 @@ def get_changes_summary():
         
     return jsonify(summary)
 
+def _format_change(platform, entry):
+    """把变更日志中的一条记录转换为接口返回的格式"""
+    # 解析日期时间为ISO格式
+    dt = entry['datetime']
+    date_str = f"{dt[0:4]}-{dt[4:6]}-{dt[6:8]}"
+    time_str = f"{dt[9:11]}:{dt[11:13]}:{dt[13:15]}"
+    return {
+        'platform': platform,
+        'date': date_str,
+        'time': time_str,
+        'datetime': f"{date_str} {time_str}",
+        'added_urls': entry.get('added_urls', []),
+        'deleted_urls': entry.get('deleted_urls', [])
+    }
+
+def _encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+def _decode_json_cursor(cursor):
+    return json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+
+def _decode_cursor(cursor):
+    """游标内容为最后一条记录的 [时间, 平台, 行偏移, 行内序号]，格式不正确时抛出 ValueError"""
+    try:
+        dt, platform, offset, pos = _decode_json_cursor(cursor)
+        return [str(dt), str(platform), int(offset), int(pos)]
+    except (TypeError, ValueError):
+        raise ValueError(cursor)
+
+def _iter_platform_changes(platform, since, cursor):
+    """按 (时间, 平台, 行偏移, 行内序号) 倒序读取单个平台的变更，跳过游标及之前已返回的记录"""
+    from backend.config import CHANGE_LOG_PATH
+    from backend.lib.changelog import changelog_file, iter_records_reverse
+    
+    before = cursor[0] if cursor else None
+    for offset, pos, entry in iter_records_reverse(changelog_file(CHANGE_LOG_PATH, platform), before, since):
+        key = [entry['datetime'], platform, offset, pos]
+        if cursor and key >= cursor:
+            continue
+        yield key, entry
+
+def _stream_changes(platforms, since, cursor, limit):
+    """多个平台的日志各自按时间倒序，k路归并后逐行输出NDJSON，超过 limit 时最后一行返回下一页游标"""
+    merged = heapq.merge(*(_iter_platform_changes(p, since, cursor) for p in platforms),
+                         key=lambda item: item[0], reverse=True)
+    count = 0
+    for key, entry in merged:
+        if limit is not None and count >= limit:
+            yield json.dumps({'next': _encode_cursor(last_key)}) + '\n'
+            return
+        yield json.dumps(_format_change(key[1], entry), ensure_ascii=False) + '\n'
+        last_key = key
+        count += 1
+
 @api_bp.route('/changes/raw', methods=['GET'])
 def get_raw_changes():
     """获取平台变更原始数据（含URL和对应日期）"""
-    import json
-    import os
-    from pathlib import Path
-    from datetime import datetime
+    from datetime import datetime, timedelta
+    from backend.config import CHANGE_LOG_PATH
+    from backend.lib.changelog import changelog_file, iter_records
     
     platform = request.args.get('platform', PLATFORMS[0])
     days = request.args.get('days')
+    output_format = request.args.get('format', 'json')
     
     if platform not in PLATFORMS and platform != 'all':
         return jsonify({"error": f"不支持的平台: {platform}"}), 400
     
-    # 项目根目录
-    root_dir = Path(__file__).parent.parent.absolute()
+    # 只返回最近几天的数据，通过偏移索引直接定位到第一条需要的记录
+    since = None
+    if days:
+        try:
+            since = (datetime.now() - timedelta(days=int(days))).strftime("%Y%m%dT%H%M%S")
+        except ValueError:
+            return jsonify({"error": "天数必须是整数"}), 400
     
     # 获取所有需要处理的平台
     target_platforms = PLATFORMS if platform == 'all' else [platform]
     
+    # 流式输出：每行一条记录，支持 limit 和游标分页
+    if output_format == 'ndjson':
+        try:
+            limit = int(request.args['limit']) if request.args.get('limit') else None
+        except ValueError:
+            return jsonify({"error": "limit必须是整数"}), 400
+        if limit is not None and limit <= 0:
+            return jsonify({"error": "limit必须大于0"}), 400
+        cursor = None
+        if request.args.get('cursor'):
+            try:
+                cursor = _decode_cursor(request.args['cursor'])
+            except ValueError:
+                return jsonify({"error": "无效的游标"}), 400
+        return Response(stream_with_context(_stream_changes(target_platforms, since, cursor, limit)),
+                        mimetype='application/x-ndjson')
+    
+    if output_format != 'json':
+        return jsonify({"error": f"不支持的格式: {output_format}"}), 400
+    
     # 结果集
     result = []
     
     # 处理每个平台的日志
     for p in target_platforms:
-        changelog_path = os.path.join(root_dir, 'data', 'change_log', f'{p}.jsonl')
-        
-        if not os.path.exists(changelog_path):
-            continue  # 跳过不存在的日志文件
-        
         try:
-            with open(changelog_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    entry = json.loads(line.strip())
-                    
-                    # 解析日期时间为ISO格式
-                    dt = entry['datetime']
-                    date_str = f"{dt[0:4]}-{dt[4:6]}-{dt[6:8]}"
-                    time_str = f"{dt[9:11]}:{dt[11:13]}:{dt[13:15]}"
-                    datetime_str = f"{date_str} {time_str}"
-                    
-                    # 存储处理后的记录
-                    record = {
-                        'platform': p,
-                        'date': date_str,
-                        'time': time_str,
-                        'datetime': datetime_str,
-                        'added_urls': entry.get('added_urls', []),
-                        'deleted_urls': entry.get('deleted_urls', [])
-                    }
-                    result.append(record)
+            for _, entry in iter_records(changelog_file(CHANGE_LOG_PATH, p), since):
+                result.append(_format_change(p, entry))
         except Exception as e:
             # 记录错误但继续处理其他平台
             print(f"处理平台 {p} 日志时出错: {str(e)}")
@@ -176,6 +282,55 @@ def get_raw_changes():
     
     return jsonify(result)
 
+def _parse_event_time(value, end=False):
+    """解析 YYYY-MM-DD 或 YYYY-MM-DD HH:MM:SS，作为结束时间的日期包含当天"""
+    from datetime import datetime, timedelta
+    
+    parsed = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+@api_bp.route('/changes/events', methods=['GET'])
+def get_change_events():
+    """按平台、时间范围和URL前缀查询变更事件"""
+    import sqlite3
+    from contextlib import closing
+    from backend.config import INDEX_DB
+    from backend.lib.events import open_readonly, query_events
+    
+    platform = request.args.get('platform', 'all')
+    limit = min(int(request.args.get('limit', PAGINATION['default_limit'])), PAGINATION['max_limit'])
+    offset = int(request.args.get('offset', 0))
+    
+    if platform not in PLATFORMS and platform != 'all':
+        return jsonify({"error": f"不支持的平台: {platform}"}), 400
+    
+    try:
+        start = _parse_event_time(request.args['start']) if request.args.get('start') else None
+        end = _parse_event_time(request.args['end'], end=True) if request.args.get('end') else None
+    except ValueError:
+        return jsonify({"error": "时间格式应为 YYYY-MM-DD 或 YYYY-MM-DD HH:MM:SS"}), 400
+    
+    try:
+        with closing(open_readonly(INDEX_DB['path'])) as conn:
+            rows = query_events(conn, None if platform == 'all' else [platform], start, end,
+                                request.args.get('url_prefix'), limit, offset)
+    except sqlite3.OperationalError:
+        return jsonify({"error": "变更事件索引不存在"}), 404
+    
+    return jsonify([{
+        'platform': row['site'],
+        'datetime': row['datetime'],
+        'url': row['url'],
+        'action': row['action'],
+    } for row in rows])
+
+@api_bp.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """获取响应缓存的命中统计"""
+    return jsonify(response_cache.stats())
+
 # 自定义错误处理
 @api_bp.errorhandler(404)
 def not_found(error):
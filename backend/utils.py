@@ -3,6 +3,8 @@
 
 import time
 import logging
+import threading
+from collections import Counter, defaultdict
 from functools import wraps
 from typing import Callable, Any
 
@@ -48,6 +50,126 @@ def handle_exceptions(func: Callable) -> Callable:
             return {"error": "内部服务器错误"}, 500
     return wrapper
 
+class ChangeSummary:
+    """变更汇总的部分结果，可以按时间顺序合并"""
+
+    def __init__(self):
+        self.total_added = 0
+        self.total_deleted = 0
+        self.changes_by_date = defaultdict(lambda: {"added": 0, "deleted": 0})
+        self.game_urls_added = Counter()
+        self.game_urls_deleted = Counter()
+        self.other_urls_added = Counter()
+        self.other_urls_deleted = Counter()
+
+    def add(self, entry: dict) -> None:
+        """汇总一条变更记录"""
+        dt = entry['datetime']
+        
+        # 日期格式化为YYYY-MM-DD
+        date_str = f"{dt[0:4]}-{dt[4:6]}-{dt[6:8]}"
+        
+        # 添加的URLs
+        for url in entry.get('added_urls', []):
+            self.total_added += 1
+            self.changes_by_date[date_str]["added"] += 1
+            
+            # 区分游戏URL和其他URL
+            if '/game/' in url:
+                self.game_urls_added[url.split('/game/')[1]] += 1
+            else:
+                self.other_urls_added[url] += 1
+        
+        # 删除的URLs
+        for url in entry.get('deleted_urls', []):
+            self.total_deleted += 1
+            self.changes_by_date[date_str]["deleted"] += 1
+            
+            # 区分游戏URL和其他URL
+            if '/game/' in url:
+                self.game_urls_deleted[url.split('/game/')[1]] += 1
+            else:
+                self.other_urls_deleted[url] += 1
+
+    def merge(self, other: 'ChangeSummary') -> 'ChangeSummary':
+        """合并更晚的部分结果，计数器中的顺序与逐条汇总时一致"""
+        self.total_added += other.total_added
+        self.total_deleted += other.total_deleted
+        for date, counts in other.changes_by_date.items():
+            self.changes_by_date[date]["added"] += counts["added"]
+            self.changes_by_date[date]["deleted"] += counts["deleted"]
+        self.game_urls_added.update(other.game_urls_added)
+        self.game_urls_deleted.update(other.game_urls_deleted)
+        self.other_urls_added.update(other.other_urls_added)
+        self.other_urls_deleted.update(other.other_urls_deleted)
+        return self
+
+    def to_dict(self) -> dict:
+        # 转换计数器对象为有序列表
+        return {
+            "total_added": self.total_added,
+            "total_deleted": self.total_deleted,
+            # 转换日期计数
+            "changes_by_date": [{"date": date, **counts} for date, counts in sorted(self.changes_by_date.items())],
+            "game_urls_added": [{"name": k, "count": v} for k, v in self.game_urls_added.most_common()],
+            "game_urls_deleted": [{"name": k, "count": v} for k, v in self.game_urls_deleted.most_common()],
+            "other_urls_added": [{"url": k, "count": v} for k, v in self.other_urls_added.most_common()],
+            "other_urls_deleted": [{"url": k, "count": v} for k, v in self.other_urls_deleted.most_common()],
+        }
+
+class ChangelogAggregate:
+    """
+    单个平台变更日志的增量汇总：记录已汇总到的文件偏移，每次只汇总新追加的行；
+    同时按天保存部分结果，最近N天的汇总由起始当天的精确结果加上之后每天的部分结果合并得到
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.offset = 0
+        self.generation = None
+        self.total = ChangeSummary()
+        self.daily = {}
+
+    def refresh(self) -> None:
+        """汇总上次之后新追加的完整行，日志被截断或改写时重新汇总"""
+        from backend.lib.changelog import get_index, iter_records
+        
+        index = get_index(self.path)
+        if index.generation != self.generation or index.end < self.offset:
+            self.reset()
+            self.generation = index.generation
+        for _, entry in iter_records(self.path, start=self.offset, end=index.end):
+            if not entry.get('datetime'):
+                continue
+            self.total.add(entry)
+            day = entry['datetime'][:8]
+            if day not in self.daily:
+                self.daily[day] = ChangeSummary()
+            self.daily[day].add(entry)
+        self.offset = index.end
+
+    def since(self, since: str) -> ChangeSummary:
+        """不早于 since（'YYYYMMDDTHHMMSS'）的变更汇总"""
+        from backend.lib.changelog import iter_records
+        
+        # 起始当天只有部分记录在范围内，通过偏移索引定位后精确汇总
+        first_day = since[:8]
+        summary = ChangeSummary()
+        for _, entry in iter_records(self.path, since, end=self.offset):
+            if entry['datetime'][:8] != first_day:
+                break
+            summary.add(entry)
+        for day in sorted(d for d in self.daily if d > first_day):
+            summary.merge(self.daily[day])
+        return summary
+
+_changelog_aggregates = {}
+_changelog_aggregates_lock = threading.Lock()
+
 def summarize_changelog(platform, days=None):
     """
     汇总指定平台的变更日志
@@ -59,85 +181,24 @@ def summarize_changelog(platform, days=None):
     Returns:
         dict: 汇总信息
     """
-    import json
     import os
     from datetime import datetime, timedelta
-    from collections import Counter, defaultdict
-    from pathlib import Path
+    from backend.config import CHANGE_LOG_PATH
+    from backend.lib.changelog import changelog_file
     
-    # 项目根目录
-    root_dir = Path(__file__).parent.parent.absolute()
-    changelog_path = os.path.join(root_dir, 'data', 'change_log', f'{platform}.jsonl')
+    changelog_path = changelog_file(CHANGE_LOG_PATH, platform)
     
     if not os.path.exists(changelog_path):
         return {"error": f"平台 {platform} 的变更日志不存在"}
     
-    # 设置日期过滤
-    cutoff_date = None
-    if days is not None:
-        cutoff_date = datetime.now() - timedelta(days=days)
-    
-    # 统计数据
-    stats = {
-        "total_added": 0,
-        "total_deleted": 0,
-        "changes_by_date": defaultdict(lambda: {"added": 0, "deleted": 0}),
-        "game_urls_added": Counter(),
-        "game_urls_deleted": Counter(),
-        "other_urls_added": Counter(),
-        "other_urls_deleted": Counter(),
-    }
-    
-    # 读取并解析 JSONL 文件
-    with open(changelog_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            try:
-                entry = json.loads(line.strip())
-                
-                # 解析日期
-                entry_date = datetime.strptime(entry['datetime'], "%Y%m%dT%H%M%S")
-                
-                # 日期过滤
-                if cutoff_date and entry_date < cutoff_date:
-                    continue
-                
-                # 日期格式化为YYYY-MM-DD
-                date_str = entry_date.strftime("%Y-%m-%d")
-                
-                # 添加的URLs
-                for url in entry.get('added_urls', []):
-                    stats["total_added"] += 1
-                    stats["changes_by_date"][date_str]["added"] += 1
-                    
-                    # 区分游戏URL和其他URL
-                    if '/game/' in url:
-                        game_name = url.split('/game/')[1]
-                        stats["game_urls_added"][game_name] += 1
-                    else:
-                        stats["other_urls_added"][url] += 1
-                
-                # 删除的URLs
-                for url in entry.get('deleted_urls', []):
-                    stats["total_deleted"] += 1
-                    stats["changes_by_date"][date_str]["deleted"] += 1
-                    
-                    # 区分游戏URL和其他URL
-                    if '/game/' in url:
-                        game_name = url.split('/game/')[1]
-                        stats["game_urls_deleted"][game_name] += 1
-                    else:
-                        stats["other_urls_deleted"][url] += 1
-                    
-            except (json.JSONDecodeError, KeyError) as e:
-                continue
-    
-    # 转换计数器对象为有序列表
-    stats["game_urls_added"] = [{"name": k, "count": v} for k, v in stats["game_urls_added"].most_common()]
-    stats["game_urls_deleted"] = [{"name": k, "count": v} for k, v in stats["game_urls_deleted"].most_common()]
-    stats["other_urls_added"] = [{"url": k, "count": v} for k, v in stats["other_urls_added"].most_common()]
-    stats["other_urls_deleted"] = [{"url": k, "count": v} for k, v in stats["other_urls_deleted"].most_common()]
-    
-    # 转换日期计数
-    stats["changes_by_date"] = [{"date": date, **counts} for date, counts in sorted(stats["changes_by_date"].items())]
+    with _changelog_aggregates_lock:
+        aggregate = _changelog_aggregates.get(changelog_path)
+        if aggregate is None:
+            aggregate = _changelog_aggregates[changelog_path] = ChangelogAggregate(changelog_path)
     
-    return stats 
\ No newline at end of file
+    with aggregate.lock:
+        aggregate.refresh()
+        if days is None:
+            return aggregate.total.to_dict()
+        since = (datetime.now() - timedelta(days=days)).strftime("%Y%m%dT%H%M%S")
+        return aggregate.since(since).to_dict()
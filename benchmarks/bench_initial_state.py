@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+对比 INITIAL_STATE 的两种提取方式：字节扫描 vs BeautifulSoup 完整解析
+
+用法:
+    python benchmarks/bench_initial_state.py [页面文件 ...]
+
+不指定文件时使用 benchmarks/fixtures/ 下保存的页面
+"""
+
+import glob
+import os
+import sys
+import timeit
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'backend'))
+
+from lib.initial_state import extract_initial_state, extract_initial_state_soup
+
+FIXTURE_DIR = os.path.join(ROOT_DIR, 'benchmarks', 'fixtures')
+
+
+def bench(path, number):
+    with open(path, 'rb') as f:
+        content = f.read()
+    html = content.decode('utf-8')
+
+    fast = extract_initial_state(content)
+    slow = extract_initial_state_soup(html)
+    if fast is None or fast != slow:
+        print(f"{os.path.basename(path)}: 两种方式结果不一致，跳过")
+        return
+
+    fast_time = timeit.timeit(lambda: extract_initial_state(content), number=number) / number
+    slow_time = timeit.timeit(lambda: extract_initial_state_soup(html), number=number) / number
+    print(f"{os.path.basename(path):<30} {len(content) / 1024:>8.1f}KB "
+          f"{fast_time * 1000:>10.3f}ms {slow_time * 1000:>10.3f}ms {slow_time / fast_time:>8.1f}x")
+
+
+def main():
+    paths = sys.argv[1:] or sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.html')))
+    if not paths:
+        print("没有找到页面文件")
+        return
+    print(f"{'page':<30} {'size':>10} {'bytes scan':>12} {'soup':>12} {'speedup':>9}")
+    for path in paths:
+        bench(path, number=20)
+
+
+if __name__ == '__main__':
+    main()
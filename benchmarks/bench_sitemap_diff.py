@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+sitemap 对比的基准测试：列表逐个查找 vs 集合差集，以及文件内容相同时的指纹短路
+
+用法:
+    python benchmarks/bench_sitemap_diff.py [--size 100000] [--legacy-size 10000]
+
+列表方式是平方复杂度，在 --size 下运行耗时过长，因此只在 --legacy-size 下运行并按平方外推
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'backend'))
+
+from lib.sitemap import diff_sitemaps, diff_url_sets, get_game_urls
+
+
+def write_sitemap(path, urls):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>'
+                '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">')
+        for url in urls:
+            f.write(f'<url><loc>{url}</loc><lastmod>2025-05-24</lastmod><changefreq>daily</changefreq></url>')
+        f.write('</urlset>')
+
+
+def make_snapshots(size, changes):
+    old = [f"https://example.com/game/game-{i:07d}" for i in range(size)]
+    new = old[changes:] + [f"https://example.com/game/new-{i:07d}" for i in range(changes)]
+    random.shuffle(new)
+    return old, new
+
+
+def legacy_diff(old_urls, new_urls):
+    new_urls, old_urls = sorted(new_urls), sorted(old_urls)
+    added = [url for url in new_urls if url not in old_urls]
+    deleted = [url for url in old_urls if url not in new_urls]
+    return added, deleted
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--legacy-size', type=int, default=10000)
+    parser.add_argument('--changes', type=int, default=50)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        old_urls, new_urls = make_snapshots(args.size, args.changes)
+        old_path = os.path.join(tmp_dir, 'old.xml')
+        new_path = os.path.join(tmp_dir, 'new.xml')
+        same_path = os.path.join(tmp_dir, 'same.xml')
+        write_sitemap(old_path, old_urls)
+        write_sitemap(new_path, new_urls)
+        shutil.copy(old_path, same_path)
+
+        parse_time, _ = timed(lambda: (get_game_urls(old_path), get_game_urls(new_path)))
+        set_time, result = timed(diff_url_sets, old_urls, new_urls)
+        print(f"{args.size} URLs, {args.changes} changed")
+        print(f"  parse both sitemaps:          {parse_time * 1000:10.1f}ms")
+        print(f"  set diff:                     {set_time * 1000:10.1f}ms")
+
+        small_old, small_new = make_snapshots(args.legacy_size, args.changes)
+        legacy_time, legacy_result = timed(legacy_diff, small_old, small_new)
+        assert legacy_result == diff_url_sets(small_old, small_new)
+        scale = (args.size / args.legacy_size) ** 2
+        print(f"  list diff @ {args.legacy_size:<8}         {legacy_time * 1000:10.1f}ms "
+              f"(~{legacy_time * scale:.0f}s extrapolated to {args.size})")
+
+        full_time, result = timed(diff_sitemaps, old_path, new_path)
+        assert len(result[0]) == len(result[1]) == args.changes
+        same_time, result = timed(diff_sitemaps, old_path, same_path)
+        assert result == ([], [])
+        print(f"  diff_sitemaps, changed:       {full_time * 1000:10.1f}ms")
+        print(f"  diff_sitemaps, identical:     {same_time * 1000:10.1f}ms (fingerprint short-circuit)")
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+# gunicorn 启动时自动加载当前目录下的 gunicorn.conf.py
+
+def worker_exit(server, worker):
+    """worker 退出时关闭该进程的数据库连接"""
+    from backend.database import close_all
+    close_all()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+import sys
+import time
+import unittest
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'backend'))
+
+from poki import RATING_MAX_INTERVAL, RATING_MIN_INTERVAL, RatingScheduler
+
+
+def db_time(hours_ago):
+    return (datetime.now() - timedelta(hours=hours_ago)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class RatingSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.addCleanup(self.conn.close)
+        self.conn.execute('CREATE TABLE games_poki (id TEXT PRIMARY KEY, url TEXT)')
+        self.conn.execute('''
+        CREATE TABLE games_rating_poki (
+            game_id TEXT, up_count INTEGER, down_count INTEGER,
+            fetch_time TIMESTAMP, confirmed_time TIMESTAMP
+        )
+        ''')
+
+    def add_game(self, game_id, *ratings):
+        self.conn.execute('INSERT INTO games_poki VALUES (?, ?)', (game_id, f"https://poki.com/en/g/{game_id}"))
+        for votes, hours_ago in ratings:
+            self.conn.execute('INSERT INTO games_rating_poki VALUES (?, ?, 0, ?, NULL)',
+                              (game_id, votes, db_time(hours_ago)))
+
+    def due(self, scheduler, game_id):
+        return next(due for due, gid in scheduler._heap if gid == game_id)
+
+    def test_unknown_velocity_uses_min_interval(self):
+        self.add_game('new', (100, 0))
+        scheduler = RatingScheduler(writer=None)
+        scheduler.load(self.conn)
+
+        self.assertIsNone(scheduler._games['new']['velocity'])
+        state = scheduler._games['new']
+        self.assertAlmostEqual(self.due(scheduler, 'new'), state['time'] + RATING_MIN_INTERVAL)
+
+    def test_velocity_after_second_sample(self):
+        self.add_game('new', (100, 0))
+        scheduler = RatingScheduler(writer=None)
+        scheduler.load(self.conn)
+        scheduler._heap.clear()
+
+        # 第二次观测：一小时内没有新投票，按观测到的速度调度而不是继续使用最短间隔
+        scheduler._games['new']['time'] = time.time() - 3600
+        scheduler._reschedule('new', 100)
+
+        self.assertEqual(scheduler._games['new']['velocity'], 0)
+        self.assertGreater(self.due(scheduler, 'new'), time.time() + RATING_MAX_INTERVAL - 60)
+
+    def test_idle_game_uses_max_interval(self):
+        self.add_game('idle', (100, 48), (100, 1))
+        scheduler = RatingScheduler(writer=None)
+        scheduler.load(self.conn)
+
+        self.assertEqual(scheduler._games['idle']['velocity'], 0)
+        state = scheduler._games['idle']
+        self.assertAlmostEqual(self.due(scheduler, 'idle'), state['time'] + RATING_MAX_INTERVAL)
+
+
+if __name__ == '__main__':
+    unittest.main()
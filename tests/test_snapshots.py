@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'backend'))
+
+from lib.sitemap import file_fingerprint
+from lib.snapshots import diff_snapshots, write_snapshot
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+    def test_identical_full_snapshots_have_same_fingerprint(self):
+        urls = [f"https://example.com/game/{i}" for i in range(100)]
+        old = write_snapshot('site', self.path, '20240101_000000', urls, full_every=1)
+        new = write_snapshot('site', self.path, '20240101_010000', reversed(urls), full_every=1)
+
+        self.assertEqual(file_fingerprint(os.path.join(self.path, old)),
+                         file_fingerprint(os.path.join(self.path, new)))
+        self.assertEqual(diff_snapshots(self.path, old, new), ([], []))
+
+
+if __name__ == '__main__':
+    unittest.main()